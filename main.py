@@ -1,7 +1,10 @@
+import math
+
 import numpy as np
 import pandas as pd
-from typing import Tuple, List, Dict
+from typing import Tuple, List
 
+from numba import njit
 from pandas.core.groupby import DataFrameGroupBy
 
 # Constants
@@ -33,6 +36,27 @@ def calculate_interaction_strength(
     delta_performance_a = performance_a[-1] - performance_a[0]  # Change in A's performance
     delta_performance_b = performance_b[-1] - performance_b[0]  # Change in B's performance
 
+    return interaction_strength_from_deltas(
+        delta_performance_a, delta_performance_b, interaction_coeff_ab, interaction_coeff_ba
+    )
+
+
+def interaction_strength_from_deltas(
+        delta_performance_a: float,
+        delta_performance_b: float,
+        interaction_coeff_ab: float,
+        interaction_coeff_ba: float
+) -> Tuple[float, float]:
+    """
+    Calculates the interaction strength between two processes A and B from the change in their performance.
+
+    :param delta_performance_a: Change in the performance of Process A over time.
+    :param delta_performance_b: Change in the performance of Process B over time.
+    :param interaction_coeff_ab: The coefficient representing how Process B affects Process A.
+    :param interaction_coeff_ba: The coefficient representing how Process A affects Process B.
+    :return: A tuple containing the interaction strength of A on B and B on A.
+    """
+
     # Interaction strength of Process A on Process B
     is_a_to_b = interaction_coeff_ab * (delta_performance_b / delta_performance_a)
 
@@ -42,26 +66,62 @@ def calculate_interaction_strength(
     return is_a_to_b, is_b_to_a
 
 
+@njit(cache=True, fastmath={'reassoc', 'contract'}, error_model='numpy')
+def _performance_stats(performance_a: np.ndarray, performance_b: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Computes the change in performance of A and B and their correlation in a single pass.
+
+    The correlation is computed over the common length of both series with Welford's update of the
+    means and (co-)moments, the changes use the full series.
+
+    :param performance_a: Array of performance metrics for Process A over time.
+    :param performance_b: Array of performance metrics for Process B over time.
+    :return: The change in performance of A and B and their Pearson correlation.
+    """
+    if performance_a.shape[0] == 0 or performance_b.shape[0] == 0:
+        raise ValueError("Performance metrics must not be empty")
+
+    n = min(performance_a.shape[0], performance_b.shape[0])
+    mean_a = 0.0
+    mean_b = 0.0
+    m2_a = 0.0
+    m2_b = 0.0
+    c_ab = 0.0
+    for i in range(n):
+        a = performance_a[i]
+        b = performance_b[i]
+        d_a = a - mean_a
+        d_b = b - mean_b
+        mean_a += d_a / (i + 1)
+        mean_b += d_b / (i + 1)
+        m2_a += d_a * (a - mean_a)
+        m2_b += d_b * (b - mean_b)
+        c_ab += d_a * (b - mean_b)
+
+    delta_a = performance_a[-1] - performance_a[0]
+    delta_b = performance_b[-1] - performance_b[0]
+    return delta_a, delta_b, c_ab / math.sqrt(m2_a * m2_b)
+
+
 def calculate_niche_overlap(
-        resource_usage_a: List[float],
-        resource_usage_b: List[float]
+        resource_usage_a: np.ndarray,
+        resource_usage_b: np.ndarray
 ) -> float:
     """
     Calculates the niche overlap between two processes A and B using Pianka's Index.
 
-    :param resource_usage_a: A list of resource usage proportions by Process A.
-    :param resource_usage_b: A list of resource usage proportions by Process B.
+    :param resource_usage_a: An array of resource usage proportions by Process A.
+    :param resource_usage_b: An array of resource usage proportions by Process B.
     :return: The niche overlap between Process A and Process B.
     """
+    a = np.asarray(resource_usage_a, dtype=np.float64)
+    b = np.asarray(resource_usage_b, dtype=np.float64)
 
     # Numerator: sum of the product of resource usage by both processes
-    numerator = sum([a * b for a, b in zip(resource_usage_a, resource_usage_b)])
+    numerator = float(a @ b)
 
     # Denominator: normalization factor
-    denominator = (
-            (sum([a ** 2 for a in resource_usage_a]) ** 0.5) *
-            (sum([b ** 2 for b in resource_usage_b]) ** 0.5)
-    )
+    denominator = math.sqrt(a @ a) * math.sqrt(b @ b)
 
     niche_overlap = numerator / denominator if denominator != 0 else 0.0
 
@@ -76,38 +136,31 @@ def extract_performance_metrics(log: pd.DataFrame) -> List[float]:
     :return: List of throughput times for each case.
     """
 
-    THROUGHPUT_TIME_KEY = 'ThroughputTime'
+    NANOSECONDS_PER_HOUR = 3_600_000_000_000
 
-    # Convert Timestamp column to datetime format if necessary
-    log[TIMESTAMP_KEY] = pd.to_datetime(log[TIMESTAMP_KEY])
+    # Convert Timestamp column to datetime format if necessary (without modifying the caller's log)
+    timestamps = log[TIMESTAMP_KEY]
+    if timestamps.dtype.kind != 'M':
+        timestamps = pd.to_datetime(timestamps, format='ISO8601')
 
     # Group by 'CaseID' to get start and end times of each case
-    case_durations = log.groupby(CASE_ID_KEY)[TIMESTAMP_KEY].agg(['min', 'max'])
+    case_timestamps = timestamps.groupby(log[CASE_ID_KEY], observed=True)
+    case_start = case_timestamps.min().to_numpy(dtype='datetime64[ns]').view('i8')
+    case_end = case_timestamps.max().to_numpy(dtype='datetime64[ns]').view('i8')
 
-    # Calculate throughput time for each case (duration between start and end)
-    case_durations[THROUGHPUT_TIME_KEY] = (case_durations['max'] - case_durations[
-        'min']).dt.total_seconds() / 3600  # in hours
+    # Calculate throughput time for each case (duration between start and end) on the int64 nanoseconds
+    return ((case_end - case_start) / NANOSECONDS_PER_HOUR).tolist()  # in hours
 
-    return case_durations[THROUGHPUT_TIME_KEY].tolist()
 
-
-def infer_resource_usage(log: pd.DataFrame) -> Dict[str, float]:
+def infer_resource_usage(log: pd.DataFrame) -> pd.Series:
     """
     Infers resource usage proportions from the event log.
 
     :param log: Event log for a process (DataFrame containing 'Activity' and 'Resource').
-    :return: A dictionary of resources and their inferred usage proportions.
+    :return: A Series of inferred usage proportions indexed by resource.
     """
-    # Count occurrences of each resource
-    resource_counts = log[RESOURCE_KEY].value_counts()
-
-    # Calculate the total number of events in the log
-    total_events = len(log)
-
-    # Calculate proportion of each resource usage
-    resource_proportions = (resource_counts / total_events).to_dict()
-
-    return resource_proportions
+    # Proportion of each resource usage, computed in a single pass without sorting the counts
+    return log[RESOURCE_KEY].value_counts(normalize=True, sort=False)
 
 
 def estimate_interaction_coeff(
@@ -121,17 +174,11 @@ def estimate_interaction_coeff(
     :param performance_b: List of performance metrics for Process B over time.
     :return: Estimated interaction coefficients (ab, ba).
     """
+    # The Pearson correlation over the common length is symmetric and therefore used for both directions
+    _, _, correlation = _performance_stats(np.asarray(performance_a, dtype=np.float64),
+                                           np.asarray(performance_b, dtype=np.float64))
 
-    if len(performance_a) != len(performance_b):
-        min_length = min(len(performance_a), len(performance_b))
-        performance_a = performance_a[:min_length]
-        performance_b = performance_b[:min_length]
-
-    # Calculate correlation coefficients
-    correlation_ab = np.corrcoef(performance_a, performance_b)[0, 1]
-    correlation_ba = np.corrcoef(performance_b, performance_a)[0, 1]
-
-    return correlation_ab, correlation_ba
+    return correlation, correlation
 
 
 def calculate_interaction_strength_from_logs(
@@ -148,13 +195,18 @@ def calculate_interaction_strength_from_logs(
     :return: Interaction strengths (A -> B and B -> A).
     """
     # Extract performance metrics (throughput time) for both logs
-    performance_a: list[float] = extract_performance_metrics(log_a)
-    performance_b: list[float] = extract_performance_metrics(log_b)
-    interaction_coeff_ab, interaction_coeff_ba = estimate_interaction_coeff(performance_a, performance_b)
+    performance_a: np.ndarray = np.asarray(extract_performance_metrics(log_a), dtype=np.float64)
+    performance_b: np.ndarray = np.asarray(extract_performance_metrics(log_b), dtype=np.float64)
+
+    # Changes in performance and the (symmetric) correlation as interaction coefficient, in one pass
+    delta_performance_a, delta_performance_b, correlation = _performance_stats(performance_a, performance_b)
+    interaction_coeff_ab, interaction_coeff_ba = correlation, correlation
 
     print("Interaction Coefficients: ", interaction_coeff_ab, interaction_coeff_ba)
     # Calculate interaction strength using the previously defined function
-    return calculate_interaction_strength(performance_a, performance_b, interaction_coeff_ab, interaction_coeff_ba)
+    return interaction_strength_from_deltas(
+        delta_performance_a, delta_performance_b, interaction_coeff_ab, interaction_coeff_ba
+    )
 
 
 def calculate_niche_overlap_from_logs(
@@ -172,14 +224,11 @@ def calculate_niche_overlap_from_logs(
     resource_usage_a = infer_resource_usage(log_a)
     resource_usage_b = infer_resource_usage(log_b)
 
-    # Convert resource usage dictionaries to lists of proportions based on shared resources
-    shared_resources = set(resource_usage_a.keys()).union(set(resource_usage_b.keys()))
-
-    resource_usage_a_values = [resource_usage_a.get(resource, 0.0) for resource in shared_resources]
-    resource_usage_b_values = [resource_usage_b.get(resource, 0.0) for resource in shared_resources]
+    # Align both usage Series on the union of their resources, unused resources get a proportion of 0
+    resource_usage_a, resource_usage_b = resource_usage_a.align(resource_usage_b, join='outer', fill_value=0.0)
 
     # Calculate niche overlap using the previously defined function
-    return calculate_niche_overlap(resource_usage_a_values, resource_usage_b_values)
+    return calculate_niche_overlap(resource_usage_a.to_numpy(), resource_usage_b.to_numpy())
 
 
 if __name__ == "__main__":
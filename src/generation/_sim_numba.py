@@ -0,0 +1,431 @@
+from typing import Tuple
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True)
+def _exec_arr(t: int,
+              marking: np.ndarray,
+              t_in_ptr: np.ndarray,
+              t_in_place: np.ndarray,
+              t_in_w: np.ndarray,
+              t_out_ptr: np.ndarray,
+              t_out_place: np.ndarray,
+              t_out_w: np.ndarray) -> None:
+    """
+    Fire transition t by updating the token count vector in place (the marking is never copied).
+    """
+    for j in range(t_in_ptr[t], t_in_ptr[t + 1]):
+        marking[t_in_place[j]] -= t_in_w[j]
+    for j in range(t_out_ptr[t], t_out_ptr[t + 1]):
+        marking[t_out_place[j]] += t_out_w[j]
+
+
+@njit(cache=True)
+def _fm_leq(final_marking: np.ndarray, marking: np.ndarray) -> bool:
+    """
+    Check whether the final marking is covered by the marking, i.e. final_marking <= marking.
+    """
+    for p in range(marking.shape[0]):
+        if final_marking[p] > marking[p]:
+            return False
+    return True
+
+
+@njit(cache=True)
+def _fm_eq(final_marking: np.ndarray, marking: np.ndarray) -> bool:
+    """
+    Check whether the marking is exactly the final marking.
+    """
+    for p in range(marking.shape[0]):
+        if final_marking[p] != marking[p]:
+            return False
+    return True
+
+
+@njit(cache=True)
+def _splitmix64(state: np.uint64) -> Tuple[np.uint64, np.uint64]:
+    """
+    Advance a splitmix64 generator, returns the new state and the next pseudo-random number.
+    """
+    state = state + np.uint64(0x9E3779B97F4A7C15)
+    z = state
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return state, z ^ (z >> np.uint64(31))
+
+
+@njit(cache=True)
+def _fill_enabled(marking: np.ndarray,
+                  t_in_ptr: np.ndarray,
+                  t_in_place: np.ndarray,
+                  t_in_w: np.ndarray,
+                  enabled: np.ndarray) -> int:
+    """
+    Write the ids of the transitions enabled in the marking into enabled and return their number.
+    """
+    n_enabled = 0
+    for t in range(t_in_ptr.shape[0] - 1):
+        is_enabled = True
+        for j in range(t_in_ptr[t], t_in_ptr[t + 1]):
+            if marking[t_in_place[j]] < t_in_w[j]:
+                is_enabled = False
+                break
+        if is_enabled:
+            enabled[n_enabled] = t
+            n_enabled += 1
+    return n_enabled
+
+
+@njit(cache=True)
+def _execute_trace(trace: np.ndarray,
+                   t_in_ptr: np.ndarray,
+                   t_in_place: np.ndarray,
+                   t_in_w: np.ndarray,
+                   t_out_ptr: np.ndarray,
+                   t_out_place: np.ndarray,
+                   t_out_w: np.ndarray,
+                   t_is_visible: np.ndarray,
+                   initial_marking: np.ndarray,
+                   final_marking: np.ndarray,
+                   has_final_marking: bool,
+                   add_only_if_fm_is_reached: bool,
+                   fm_leq_accepted: bool,
+                   state: np.uint64) -> Tuple[int, bool]:
+    """
+    Execute a single trace, writing its visible transition ids into trace.
+
+    Returns the number of visible transitions and whether the trace is accepted.
+    """
+    max_trace_length = trace.shape[0]
+
+    marking = initial_marking.copy()
+    enabled = np.empty(t_in_ptr.shape[0] - 1, dtype=np.int32)
+    length = 0
+
+    while length < max_trace_length:
+        n_enabled = _fill_enabled(marking, t_in_ptr, t_in_place, t_in_w, enabled)
+        if n_enabled == 0:  # supports nets with possible deadlocks
+            break
+
+        # Once the final marking is reached, stopping the trace is one more option to choose from
+        can_stop = has_final_marking and _fm_leq(final_marking, marking) and (
+                fm_leq_accepted or _fm_eq(final_marking, marking))
+
+        n_choices = n_enabled + 1 if can_stop else n_enabled
+        state, r = _splitmix64(state)
+        k = int(r % np.uint64(n_choices))
+        if k == n_enabled:
+            break
+
+        t = enabled[k]
+        if t_is_visible[t]:
+            trace[length] = t
+            length += 1
+
+        _exec_arr(t, marking, t_in_ptr, t_in_place, t_in_w, t_out_ptr, t_out_place, t_out_w)
+
+    # Check if we should add the trace based on final marking conditions
+    accepted = not add_only_if_fm_is_reached or (has_final_marking and (
+            _fm_eq(final_marking, marking) or (fm_leq_accepted and _fm_leq(final_marking, marking))))
+    return length, accepted
+
+
+@njit(
+    'Tuple((int32[::1], boolean[::1]))('
+    'int32[::1], int64, int64, int64, int32[::1], int32[::1], int32[::1], int32[::1], int32[::1], int32[::1], '
+    'boolean[::1], int32[::1], int32[::1], boolean, boolean, boolean, uint64)',
+    cache=True, parallel=True, boundscheck=False
+)
+def _playout_batch(out: np.ndarray,
+                   offset: int,
+                   n_traces: int,
+                   max_trace_length: int,
+                   t_in_ptr: np.ndarray,
+                   t_in_place: np.ndarray,
+                   t_in_w: np.ndarray,
+                   t_out_ptr: np.ndarray,
+                   t_out_place: np.ndarray,
+                   t_out_w: np.ndarray,
+                   t_is_visible: np.ndarray,
+                   initial_marking: np.ndarray,
+                   final_marking: np.ndarray,
+                   has_final_marking: bool,
+                   add_only_if_fm_is_reached: bool,
+                   fm_leq_accepted: bool,
+                   seed: np.uint64) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Execute independent traces in parallel, each one with its own random stream derived from seed and its index.
+
+    The visible transition ids of trace i are written to out[offset + i * max_trace_length:], lengths[i] of them
+    are valid. Returns the lengths and whether each trace is accepted.
+    """
+    lengths = np.zeros(n_traces, dtype=np.int32)
+    accepted = np.zeros(n_traces, dtype=np.bool_)
+
+    for i in prange(n_traces):
+        _, state = _splitmix64(seed + np.uint64(i))
+        start = offset + i * max_trace_length
+        lengths[i], accepted[i] = _execute_trace(
+            out[start:start + max_trace_length], t_in_ptr, t_in_place, t_in_w, t_out_ptr, t_out_place, t_out_w,
+            t_is_visible, initial_marking, final_marking, has_final_marking, add_only_if_fm_is_reached,
+            fm_leq_accepted, state
+        )
+
+    return lengths, accepted
+
+
+@njit(
+    'Tuple((int32[:], int32[:]))('
+    'int64, int64, int32[::1], int32[::1], int32[::1], int32[::1], int32[::1], int32[::1], boolean[::1], '
+    'int32[::1], int32[::1], boolean, boolean, boolean, uint64)',
+    cache=True, boundscheck=False
+)
+def _playout(no_traces: int,
+             max_trace_length: int,
+             t_in_ptr: np.ndarray,
+             t_in_place: np.ndarray,
+             t_in_w: np.ndarray,
+             t_out_ptr: np.ndarray,
+             t_out_place: np.ndarray,
+             t_out_w: np.ndarray,
+             t_is_visible: np.ndarray,
+             initial_marking: np.ndarray,
+             final_marking: np.ndarray,
+             has_final_marking: bool,
+             add_only_if_fm_is_reached: bool,
+             fm_leq_accepted: bool,
+             seed: np.uint64) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Play out traces on the CSR encoding of a net with classic semantics.
+
+    Traces are executed in parallel batches: first no_traces of them, then, if only traces reaching the
+    final marking are kept, further batches for the missing ones as long as at least one trace was accepted.
+    Returns the visible transition ids of the accepted traces as CSR: the transitions of trace i are
+    trace_trans[trace_ptr[i]:trace_ptr[i + 1]].
+    """
+    trace_ptr = np.zeros(no_traces + 1, dtype=np.int32)
+    trace_trans = np.empty(no_traces * max_trace_length, dtype=np.int32)
+
+    n_added = 0
+    n_executed = 0
+    batch_size = no_traces
+    while n_added < no_traces and batch_size > 0:
+        # Each batch writes its traces in rows of max_trace_length right behind the accepted ones, the free space
+        # always fits them since no accepted trace is longer than a row
+        offset = trace_ptr[n_added]
+        lengths, accepted = _playout_batch(
+            trace_trans, offset, batch_size, max_trace_length, t_in_ptr, t_in_place, t_in_w, t_out_ptr,
+            t_out_place, t_out_w, t_is_visible, initial_marking, final_marking, has_final_marking,
+            add_only_if_fm_is_reached, fm_leq_accepted, seed + np.uint64(n_executed)
+        )
+        n_executed += batch_size
+
+        # Compact the accepted traces in place, they only ever move towards the front of the buffer
+        for i in range(batch_size):
+            if accepted[i] and n_added < no_traces:
+                start = trace_ptr[n_added]
+                row = offset + i * max_trace_length
+                for j in range(lengths[i]):
+                    trace_trans[start + j] = trace_trans[row + j]
+                n_added += 1
+                trace_ptr[n_added] = start + lengths[i]
+
+        if not add_only_if_fm_is_reached or n_added == 0:
+            # likely, the final marking is not reachable, therefore terminate here the playout
+            break
+        batch_size = no_traces - n_added
+
+    return trace_ptr[:n_added + 1], trace_trans[:trace_ptr[n_added]]
+
+
+@njit(cache=True)
+def _is_enabled(t: int,
+                marking: np.ndarray,
+                t_in_ptr: np.ndarray,
+                t_in_place: np.ndarray,
+                t_in_w: np.ndarray) -> bool:
+    """
+    Check whether transition t is enabled in the marking.
+    """
+    for j in range(t_in_ptr[t], t_in_ptr[t + 1]):
+        if marking[t_in_place[j]] < t_in_w[j]:
+            return False
+    return True
+
+
+@njit(cache=True, nogil=True)
+def _init_enabled(marking: np.ndarray,
+                  t_in_ptr: np.ndarray,
+                  t_in_place: np.ndarray,
+                  t_in_w: np.ndarray,
+                  enabled: np.ndarray,
+                  enabled_pos: np.ndarray) -> int:
+    """
+    Compute the set of enabled transitions from scratch and return its size.
+
+    The set is stored as the dense list enabled[:n_enabled] and the position of each transition in that list
+    (-1 for disabled ones) in enabled_pos, so that transitions can be added and removed in constant time.
+    """
+    n_enabled = 0
+    for t in range(t_in_ptr.shape[0] - 1):
+        if _is_enabled(t, marking, t_in_ptr, t_in_place, t_in_w):
+            enabled[n_enabled] = t
+            enabled_pos[t] = n_enabled
+            n_enabled += 1
+        else:
+            enabled_pos[t] = -1
+    return n_enabled
+
+
+@njit(cache=True)
+def _update_enabled(p: int,
+                    marking: np.ndarray,
+                    t_in_ptr: np.ndarray,
+                    t_in_place: np.ndarray,
+                    t_in_w: np.ndarray,
+                    p_cons_ptr: np.ndarray,
+                    p_cons_trans: np.ndarray,
+                    enabled: np.ndarray,
+                    enabled_pos: np.ndarray,
+                    n_enabled: int) -> int:
+    """
+    Re-check the transitions consuming from place p and return the new size of the enabled set.
+    """
+    for j in range(p_cons_ptr[p], p_cons_ptr[p + 1]):
+        t = p_cons_trans[j]
+        is_enabled = _is_enabled(t, marking, t_in_ptr, t_in_place, t_in_w)
+        if is_enabled and enabled_pos[t] < 0:
+            enabled[n_enabled] = t
+            enabled_pos[t] = n_enabled
+            n_enabled += 1
+        elif not is_enabled and enabled_pos[t] >= 0:
+            # Move the last enabled transition into the freed slot
+            last = enabled[n_enabled - 1]
+            enabled[enabled_pos[t]] = last
+            enabled_pos[last] = enabled_pos[t]
+            enabled_pos[t] = -1
+            n_enabled -= 1
+    return n_enabled
+
+
+@njit(cache=True, nogil=True)
+def _fire_incremental(t: int,
+                      marking: np.ndarray,
+                      t_in_ptr: np.ndarray,
+                      t_in_place: np.ndarray,
+                      t_in_w: np.ndarray,
+                      t_out_ptr: np.ndarray,
+                      t_out_place: np.ndarray,
+                      t_out_w: np.ndarray,
+                      p_cons_ptr: np.ndarray,
+                      p_cons_trans: np.ndarray,
+                      enabled: np.ndarray,
+                      enabled_pos: np.ndarray,
+                      n_enabled: int) -> int:
+    """
+    Fire transition t in place and update the enabled set, only the consumers of the touched places are re-checked.
+    """
+    _exec_arr(t, marking, t_in_ptr, t_in_place, t_in_w, t_out_ptr, t_out_place, t_out_w)
+    for j in range(t_in_ptr[t], t_in_ptr[t + 1]):
+        n_enabled = _update_enabled(t_in_place[j], marking, t_in_ptr, t_in_place, t_in_w,
+                                    p_cons_ptr, p_cons_trans, enabled, enabled_pos, n_enabled)
+    for j in range(t_out_ptr[t], t_out_ptr[t + 1]):
+        n_enabled = _update_enabled(t_out_place[j], marking, t_in_ptr, t_in_place, t_in_w,
+                                    p_cons_ptr, p_cons_trans, enabled, enabled_pos, n_enabled)
+    return n_enabled
+
+
+# Return codes of _run_until_visible besides a transition id
+DEADLOCK: int = -1
+STOP: int = -2
+
+
+@njit(cache=True, boundscheck=False, nogil=True)
+def _run_until_visible(marking: np.ndarray,
+                       t_in_ptr: np.ndarray,
+                       t_in_place: np.ndarray,
+                       t_in_w: np.ndarray,
+                       t_out_ptr: np.ndarray,
+                       t_out_place: np.ndarray,
+                       t_out_w: np.ndarray,
+                       p_cons_ptr: np.ndarray,
+                       p_cons_trans: np.ndarray,
+                       t_stop: np.ndarray,
+                       final_marking: np.ndarray,
+                       has_final_marking: bool,
+                       fm_leq_accepted: bool,
+                       enabled: np.ndarray,
+                       enabled_pos: np.ndarray,
+                       n_enabled: np.ndarray,
+                       rng_state: np.ndarray) -> int:
+    """
+    Randomly fire transitions on the marking in place until a transition flagged in t_stop is selected.
+
+    The selected transition is not fired, its id is returned so that the caller can fire it. Returns DEADLOCK if
+    no transition is enabled and STOP if stopping in the final marking was chosen. The enabled set (see
+    _init_enabled) is kept up to date, its size and the splitmix64 state are kept in the one-element arrays
+    n_enabled and rng_state.
+    """
+    state = rng_state[0]
+    n = n_enabled[0]
+
+    while True:
+        if n == 0:
+            rng_state[0] = state
+            n_enabled[0] = n
+            return DEADLOCK
+
+        # Once the final marking is reached, stopping the trace is one more option to choose from
+        can_stop = has_final_marking and _fm_leq(final_marking, marking) and (
+                fm_leq_accepted or _fm_eq(final_marking, marking))
+
+        n_choices = n + 1 if can_stop else n
+        state, r = _splitmix64(state)
+        k = int(r % np.uint64(n_choices))
+        if k == n:
+            rng_state[0] = state
+            n_enabled[0] = n
+            return STOP
+
+        t = enabled[k]
+        if t_stop[t]:
+            rng_state[0] = state
+            n_enabled[0] = n
+            return t
+
+        n = _fire_incremental(t, marking, t_in_ptr, t_in_place, t_in_w, t_out_ptr, t_out_place, t_out_w,
+                              p_cons_ptr, p_cons_trans, enabled, enabled_pos, n)
+
+
+@njit(cache=True, parallel=True, nogil=True)
+def _select_transitions(markings: np.ndarray,
+                        final_markings: np.ndarray,
+                        has_final_marking: np.ndarray,
+                        fm_leq_accepted: np.ndarray,
+                        enabled: np.ndarray,
+                        n_enabled: np.ndarray,
+                        rng_states: np.ndarray,
+                        selected: np.ndarray) -> None:
+    """
+    Randomly select the next transition of many independent nets in parallel, one net per row of the arguments.
+
+    Writes the selected transition id of every net into selected, DEADLOCK if none is enabled and STOP if
+    stopping in the final marking was chosen. Rows are zero padded to the largest net, nothing is fired.
+    """
+    for a in prange(markings.shape[0]):
+        n = n_enabled[a]
+        if n == 0:
+            selected[a] = DEADLOCK
+            continue
+
+        # Once the final marking is reached, stopping the trace is one more option to choose from
+        can_stop = has_final_marking[a] and _fm_leq(final_markings[a], markings[a]) and (
+                fm_leq_accepted[a] or _fm_eq(final_markings[a], markings[a]))
+
+        n_choices = n + 1 if can_stop else n
+        state, r = _splitmix64(rng_states[a])
+        rng_states[a] = state
+        k = int(r % np.uint64(n_choices))
+        selected[a] = STOP if k == n else enabled[a, k]
@@ -1,8 +1,12 @@
 import datetime
+import sys
 from copy import copy
 from enum import Enum
-from random import choice
-from typing import Optional, Dict, Any, Union, List
+from itertools import islice
+from typing import Optional, Dict, Any, Union, List, Collection, Tuple, Sequence
+
+import numpy as np
+import pandas as pd
 
 import pm4py.objects.log.obj
 from pm4py.objects import petri_net
@@ -14,9 +18,13 @@ from pm4py.util import exec_utils
 from pm4py.util import xes_constants
 from pm4py.util.dt_parsing.variants import strpfromiso
 
-from src.generation.constants import SimPetriNet
+from src.generation._sim_numba import _playout
+from src.generation.constants import SimPetriNet, ClassicPetriNetSemantics, freeze, NetArrays
 
-SimNode = Union[SimPetriNet.SimPlace, SimPetriNet.SimTransition]
+# Semantics that are executed by the compiled playout kernel instead of the Python token game
+COMPILED_SEMANTICS = (petri_net.semantics.ClassicSemantics, ClassicPetriNetSemantics)
+# Random generator of the playout when the caller does not pass one
+_DEFAULT_RNG: np.random.Generator = np.random.default_rng()
 
 
 class Parameters(Enum):
@@ -31,6 +39,8 @@ class Parameters(Enum):
     FM_LEQ_ACCEPTED = "fm_leq_accepted"
     INITIAL_TIMESTAMP = "initial_timestamp"
     INITIAL_CASE_ID = "initial_case_id"
+    RETURN_DATAFRAME = "return_dataframe"
+    SEED = "seed"
 
 
 def execute_single_trace(
@@ -39,85 +49,152 @@ def execute_single_trace(
         max_trace_length: int,
         final_marking: Optional[Marking],
         semantics: petri_net.semantics.Semantics,
-        fm_leq_accepted: bool) -> tuple[List[SimNode], Marking]:
+        fm_leq_accepted: bool,
+        rng: Optional[np.random.Generator] = None) -> tuple[List[SimPetriNet.SimTransition], Marking]:
     """
-    Execute a single trace through the Petri net and return visited elements.
+    Execute a single trace through the Petri net and return the visited visible transitions and the reached marking.
     """
-    visited_elements: List[SimNode] = []
     visible_transitions_visited: List[SimPetriNet.SimTransition] = []
     marking = copy(initial_marking)
 
     while len(visible_transitions_visited) < max_trace_length:
-        visited_elements.append(marking)
-
-        if not semantics.enabled_transitions(net, marking):  # supports nets with possible deadlocks
+        all_enabled_trans = semantics.enabled_transitions(net, marking)
+        if not all_enabled_trans:  # supports nets with possible deadlocks
             break
 
-        all_enabled_trans = semantics.enabled_transitions(net, marking)
-        trans: SimPetriNet.SimTransition = select_transition(all_enabled_trans, final_marking, marking, fm_leq_accepted)
+        trans: Optional[SimPetriNet.SimTransition] = select_transition(
+            all_enabled_trans, final_marking, marking, fm_leq_accepted, rng
+        )
 
         if trans is None:
             break
 
-        visited_elements.append(trans)
         if trans.label is not None:
             visible_transitions_visited.append(trans)
 
         marking = semantics.execute(trans, net, marking)
 
-    return visited_elements, marking
+    return visible_transitions_visited, marking
 
 
 def select_transition(
-        all_enabled_trans: List[SimPetriNet.SimTransition],
+        all_enabled_trans: Collection[SimPetriNet.SimTransition],
         final_marking: Marking,
         marking: Marking,
-        fm_leq_accepted: bool) -> SimPetriNet.SimTransition:
+        fm_leq_accepted: bool,
+        rng: Optional[np.random.Generator] = None) -> Optional[SimPetriNet.SimTransition]:
     """
     Select the next transition based on the current state and final marking requirements.
+    Once the final marking is reached, not firing any transition (None) is one more option.
     """
-    if final_marking is not None and final_marking <= marking and (final_marking == marking or fm_leq_accepted):
-        return choice(list(all_enabled_trans.union({None})))
-    else:
-        return choice(list(all_enabled_trans))
+    rng = rng if rng is not None else _DEFAULT_RNG
+    final_allowed = (final_marking is not None and final_marking <= marking and
+                     (final_marking == marking or fm_leq_accepted))
+
+    n_enabled = len(all_enabled_trans)
+    idx = int(rng.integers(0, n_enabled + int(final_allowed)))
+    if idx == n_enabled:
+        return None
+    if isinstance(all_enabled_trans, Sequence):
+        return all_enabled_trans[idx]
+    # Sets are not indexable, step to the selected transition instead of copying them
+    return next(islice(all_enabled_trans, idx, None))
+
+
+def flatten_visited_elements(
+        visited_elements_list: List[List[SimPetriNet.SimTransition]],
+        initial_timestamp: datetime.datetime) -> Tuple[List[int], List[str], np.ndarray]:
+    """
+    Flatten the visible transitions visited by each trace into the trace lengths, the labels and the timestamps.
+    """
+    # Only simulation transitions have a duration and create events, other transitions of the net are skipped
+    visited_elements_list = [
+        [t for t in visited_elements if type(t) is SimPetriNet.SimTransition]
+        for visited_elements in visited_elements_list
+    ]
+    # Timestamps keep increasing across the traces of the log
+    trace_lengths: List[int] = [len(visited_elements) for visited_elements in visited_elements_list]
+    labels: List[str] = [t.label for visited_elements in visited_elements_list for t in visited_elements]
+    durations: List[datetime.timedelta] = [
+        t.duration for visited_elements in visited_elements_list for t in visited_elements
+    ]
+
+    # Accumulate all durations at once on the wall clock time, the UTC offset is added back when formatting
+    offsets: np.ndarray = np.cumsum(np.array(durations, dtype='timedelta64[us]'))
+    return trace_lengths, labels, np.datetime64(initial_timestamp.replace(tzinfo=None), 'us') + offsets
+
+
+def format_timestamps(timestamps: np.ndarray, initial_timestamp: datetime.datetime) -> List[str]:
+    """
+    Format wall clock timestamps like datetime.isoformat, with the UTC offset of the initial timestamp.
+    """
+    tz_suffix: str = initial_timestamp.isoformat()[len(initial_timestamp.replace(tzinfo=None).isoformat()):]
+    # isoformat leaves out the microseconds if they are zero
+    return [
+        (timestamp[:-7] if timestamp.endswith('.000000') else timestamp) + tz_suffix
+        for timestamp in np.datetime_as_string(timestamps, unit='us').tolist()
+    ]
 
 
 def convert_to_event_log(
-        visited_elements_list: List[List[SimNode]],
+        visited_elements_list: List[List[SimPetriNet.SimTransition]],
         initial_timestamp: datetime.datetime,
         initial_case_id: int,
         case_id_key: str,
         activity_key: str,
         timestamp_key: str) -> EventLog:
     """
-    Convert a list of visited elements into an event log.
+    Convert the visible transitions visited by each trace into an event log.
     """
-    log = log_instance.EventLog()
-    curr_timestamp: datetime.datetime = initial_timestamp
+    trace_lengths, labels, timestamp_array = flatten_visited_elements(visited_elements_list, initial_timestamp)
+    # Format the timestamps in a single batch
+    timestamps: List[str] = format_timestamps(timestamp_array, initial_timestamp)
+
+    # Events are built from ready-made dicts and traces from lists of known size, with the keys interned once
+    ak: str = sys.intern(activity_key)
+    tk: str = sys.intern(timestamp_key)
+    traces: List[log_instance.Trace] = []
+    position = 0
 
-    for index, visited_elements in enumerate(visited_elements_list):
-        trace = log_instance.Trace()
-        trace.attributes[case_id_key] = str(index + initial_case_id)
+    for index, trace_length in enumerate(trace_lengths):
+        events: List[log_instance.Event] = [
+            log_instance.Event({ak: labels[j], tk: timestamps[j]}) for j in range(position, position + trace_length)
+        ]
+        traces.append(log_instance.Trace(events, attributes={case_id_key: str(index + initial_case_id)}))
+        position += trace_length
 
-        for element in visited_elements:
-            if type(element) is SimPetriNet.SimTransition and element.label is not None:
-                event = log_instance.Event()
-                event[activity_key] = element.label
-                new_timestamp = curr_timestamp + element.duration
-                event[timestamp_key] = new_timestamp.isoformat()
-                trace.append(event)
-                curr_timestamp = new_timestamp
+    return log_instance.EventLog(traces)
 
-        log.append(trace)
 
-    return log
+def convert_to_dataframe(
+        visited_elements_list: List[List[SimPetriNet.SimTransition]],
+        initial_timestamp: datetime.datetime,
+        initial_case_id: int,
+        case_id_key: str,
+        activity_key: str,
+        timestamp_key: str) -> pd.DataFrame:
+    """
+    Convert the visible transitions visited by each trace into a dataframe with one row per event, built from
+    its columns without creating the events of an event log.
+    """
+    trace_lengths, labels, timestamps = flatten_visited_elements(visited_elements_list, initial_timestamp)
+    if initial_timestamp.tzinfo is not None:
+        timestamps = pd.DatetimeIndex(timestamps).tz_localize(initial_timestamp.tzinfo)
+    case_ids: np.ndarray = np.repeat(
+        np.array([str(index + initial_case_id) for index in range(len(trace_lengths))], dtype=object), trace_lengths
+    )
+    return pd.DataFrame({
+        activity_key: labels,
+        timestamp_key: timestamps,
+        constants.CASE_ATTRIBUTE_PREFIX + case_id_key: case_ids
+    })
 
 
 def playout_algorithm(net: SimPetriNet,
                       initial_marking: Marking,
                       no_traces: int = 100,
                       max_trace_length: int = 100,
-                      initial_timestamp: datetime.datetime = datetime.datetime.now(),
+                      initial_timestamp: Optional[datetime.datetime] = None,
                       initial_case_id: int = 0,
                       case_id_key: str = xes_constants.DEFAULT_TRACEID_KEY,
                       activity_key: str = xes_constants.DEFAULT_NAME_KEY,
@@ -125,12 +202,51 @@ def playout_algorithm(net: SimPetriNet,
                       final_marking: Optional[Marking] = None,
                       semantics: petri_net.semantics.Semantics = petri_net.semantics.ClassicSemantics(),
                       add_only_if_fm_is_reached: bool = False,
-                      fm_leq_accepted: bool = False) -> EventLog:
+                      fm_leq_accepted: bool = False,
+                      return_dataframe: bool = False,
+                      seed: Optional[int] = None) -> Union[EventLog, pd.DataFrame]:
     """
     Main playout algorithm that simulates traces through a Petri net.
     """
+    if initial_timestamp is None:
+        initial_timestamp = datetime.datetime.now()
+
+    # A seed makes the playout reproducible, the traces are drawn from fresh entropy otherwise
+    rng: np.random.Generator = np.random.default_rng(seed)
+    arrays: NetArrays = freeze(net)
+
+    if type(semantics) in COMPILED_SEMANTICS:
+        all_visited_elements = execute_traces_compiled(
+            arrays, initial_marking, no_traces, max_trace_length,
+            final_marking, add_only_if_fm_is_reached, fm_leq_accepted, rng
+        )
+    else:
+        all_visited_elements = execute_traces(
+            net, initial_marking, no_traces, max_trace_length,
+            final_marking, semantics, add_only_if_fm_is_reached, fm_leq_accepted, rng
+        )
+
+    convert = convert_to_dataframe if return_dataframe else convert_to_event_log
+    return convert(
+        all_visited_elements, initial_timestamp, initial_case_id,
+        case_id_key, activity_key, timestamp_key
+    )
 
-    all_visited_elements: List[List[SimNode]] = []
+
+def execute_traces(
+        net: SimPetriNet,
+        initial_marking: Marking,
+        no_traces: int,
+        max_trace_length: int,
+        final_marking: Optional[Marking],
+        semantics: petri_net.semantics.Semantics,
+        add_only_if_fm_is_reached: bool,
+        fm_leq_accepted: bool,
+        rng: Optional[np.random.Generator] = None) -> List[List[SimPetriNet.SimTransition]]:
+    """
+    Execute traces with the given semantics until enough of them are accepted.
+    """
+    all_visited_elements: List[List[SimPetriNet.SimTransition]] = []
     i = 0
 
     while True:
@@ -147,7 +263,7 @@ def playout_algorithm(net: SimPetriNet,
 
         visited_elements, marking = execute_single_trace(
             net, initial_marking, max_trace_length,
-            final_marking, semantics, fm_leq_accepted
+            final_marking, semantics, fm_leq_accepted, rng
         )
 
         # Check if we should add the trace based on final marking conditions
@@ -156,11 +272,39 @@ def playout_algorithm(net: SimPetriNet,
 
         i += 1
 
-    return convert_to_event_log(
-        all_visited_elements, initial_timestamp, initial_case_id,
-        case_id_key, activity_key, timestamp_key
+    return all_visited_elements
+
+
+def execute_traces_compiled(
+        arrays: NetArrays,
+        initial_marking: Marking,
+        no_traces: int,
+        max_trace_length: int,
+        final_marking: Optional[Marking],
+        add_only_if_fm_is_reached: bool,
+        fm_leq_accepted: bool,
+        rng: Optional[np.random.Generator] = None) -> List[List[SimPetriNet.SimTransition]]:
+    """
+    Execute traces with classic semantics in the compiled kernel and return their visible transitions.
+    """
+    rng = rng if rng is not None else _DEFAULT_RNG
+    trace_ptr, trace_trans = _playout(
+        no_traces, max_trace_length,
+        arrays.t_in_ptr, arrays.t_in_place, arrays.t_in_w,
+        arrays.t_out_ptr, arrays.t_out_place, arrays.t_out_w, arrays.t_is_visible,
+        arrays.marking_to_array(initial_marking), arrays.marking_to_array(final_marking),
+        final_marking is not None, bool(add_only_if_fm_is_reached), bool(fm_leq_accepted),
+        int(rng.integers(2 ** 32))
     )
 
+    transitions = arrays.transitions
+    trace_ptr = trace_ptr.tolist()
+    trace_trans = trace_trans.tolist()
+    return [
+        [transitions[t] for t in trace_trans[trace_ptr[i]:trace_ptr[i + 1]]]
+        for i in range(len(trace_ptr) - 1)
+    ]
+
 
 def should_add_trace(
         marking: Marking,
@@ -181,7 +325,7 @@ def apply_playout(
         net: SimPetriNet,
         initial_marking: Marking,
         final_marking: Marking = None,
-        parameters: Optional[Dict[Union[str, Parameters], Any]] = None) -> EventLog:
+        parameters: Optional[Dict[Union[str, Parameters], Any]] = None) -> Union[EventLog, pd.DataFrame]:
     """
     Do the playout of a Petrinet generating a log
 
@@ -202,6 +346,8 @@ def apply_playout(
             Parameters.PETRI_SEMANTICS -> Petri net semantics to be used (default: petri_nets.semantics.ClassicSemantics())
             Parameters.ADD_ONLY_IF_FM_IS_REACHED -> adds the case only if the final marking is reached
             Parameters.FM_LEQ_ACCEPTED -> Accepts traces ending in a marking that is a superset of the final marking
+            Parameters.RETURN_DATAFRAME -> Returns the events as a dataframe instead of an event log
+            Parameters.SEED -> Seed of the random generator, makes the playout reproducible
     """
     if parameters is None:
         parameters = {}
@@ -212,8 +358,10 @@ def apply_playout(
     no_traces = exec_utils.get_param_value(Parameters.NO_TRACES, parameters, 1000)
     max_trace_length = exec_utils.get_param_value(Parameters.MAX_TRACE_LENGTH, parameters, 1000)
 
-    it: Any = exec_utils.get_param_value(Parameters.INITIAL_TIMESTAMP, parameters, datetime.datetime.now())
-    initial_timestamp: datetime.datetime = datetime.datetime.fromtimestamp(it.timestamp())
+    it: Any = exec_utils.get_param_value(Parameters.INITIAL_TIMESTAMP, parameters, None)
+    initial_timestamp: datetime.datetime = (
+        datetime.datetime.fromtimestamp(it.timestamp()) if it is not None else datetime.datetime.now()
+    )
 
     initial_case_id = exec_utils.get_param_value(Parameters.INITIAL_CASE_ID, parameters, 0)
 
@@ -221,6 +369,8 @@ def apply_playout(
                                            petri_net.semantics.ClassicSemantics())
     add_only_if_fm_is_reached = exec_utils.get_param_value(Parameters.ADD_ONLY_IF_FM_IS_REACHED, parameters, False)
     fm_leq_accepted = exec_utils.get_param_value(Parameters.FM_LEQ_ACCEPTED, parameters, False)
+    return_dataframe = exec_utils.get_param_value(Parameters.RETURN_DATAFRAME, parameters, False)
+    seed = exec_utils.get_param_value(Parameters.SEED, parameters, None)
 
     return playout_algorithm(
         net,
@@ -235,5 +385,7 @@ def apply_playout(
         final_marking=final_marking,
         semantics=semantics,
         add_only_if_fm_is_reached=add_only_if_fm_is_reached,
-        fm_leq_accepted=fm_leq_accepted
+        fm_leq_accepted=fm_leq_accepted,
+        return_dataframe=return_dataframe,
+        seed=seed
     )
@@ -1,8 +1,9 @@
 import abc
-from copy import copy
+from copy import copy, deepcopy
 from datetime import timedelta, datetime
-from typing import Optional, List, Any, Callable, Self, Set
+from typing import Optional, List, Any, Callable, Self, Set, Dict, NamedTuple, Tuple, Iterable
 
+import numpy as np
 import pm4py
 from pm4py import PetriNet, Marking
 
@@ -44,6 +45,16 @@ class RobotArm(BaseResource):
         super().__init__("Robot Arm (Welding/Painting)", 1)
 
 
+def _reindex(items: Set[Any], order: List[Any]) -> List[Any]:
+    """ Order the items of a set, keeping the known order and appending the others, and cache their index """
+    ordered: List[Any] = [x for x in order if x in items]
+    known: Set[Any] = set(ordered)
+    ordered.extend(x for x in items if x not in known)
+    for i, x in enumerate(ordered):
+        x._idx = i
+    return ordered
+
+
 class SimPetriNet(pm4py.PetriNet):
     def __init__(self,
                  name: str,
@@ -52,6 +63,90 @@ class SimPetriNet(pm4py.PetriNet):
                  arcs: Optional[List['Arc']] = None,
                  properties: dict = None):
         super().__init__(name, places, transitions, arcs, properties)
+        # Places and transitions in insertion order, the position of each one is cached on it as _idx
+        self._place_order: List[SimPetriNet.SimPlace] = _reindex(self.places, [])
+        self._transition_order: List[SimPetriNet.SimTransition] = _reindex(self.transitions, [])
+
+    def add_place(self, place: 'SimPetriNet.SimPlace') -> 'SimPetriNet.SimPlace':
+        """ Add a place to the net and index it """
+        if place not in self.places:
+            self.places.add(place)
+            place._idx = len(self._place_order)
+            self._place_order.append(place)
+        return place
+
+    def add_transition(self, transition: 'SimPetriNet.SimTransition') -> 'SimPetriNet.SimTransition':
+        """ Add a transition to the net and index it """
+        if transition not in self.transitions:
+            self.transitions.add(transition)
+            transition._idx = len(self._transition_order)
+            self._transition_order.append(transition)
+        return transition
+
+    def add_arc(self, arc: 'SimPetriNet.SimArc') -> 'SimPetriNet.SimArc':
+        """ Add an arc to the net and connect it to its source and target """
+        self.arcs.add(arc)
+        arc.source.out_arcs.add(arc)
+        arc.target.in_arcs.add(arc)
+        # Invalidate the frozen arcs of the connected transition
+        if isinstance(arc.source, SimPetriNet.SimTransition):
+            arc.source._postset = None
+        if isinstance(arc.target, SimPetriNet.SimTransition):
+            arc.target._preset = None
+        return arc
+
+    def add_arcs_from(self, pairs: Iterable[Tuple[Any, Any]], weight: int = 1) -> List['SimPetriNet.SimArc']:
+        """ Add an arc for every (source, target) pair and return the arcs in the given order """
+        arcs: List[SimPetriNet.SimArc] = [SimPetriNet.SimArc(fr, to, weight) for fr, to in pairs]
+        for arc in arcs:
+            arc.source.out_arcs.add(arc)
+            arc.target.in_arcs.add(arc)
+        self.arcs.update(arcs)
+        # Invalidate the frozen arcs of all connected transitions at once
+        for node in {node for arc in arcs for node in (arc.source, arc.target)}:
+            if isinstance(node, SimPetriNet.SimTransition):
+                node._preset = None
+                node._postset = None
+        return arcs
+
+    def __deepcopy__(self, memodict: Optional[dict] = None) -> 'SimPetriNet':
+        """ Deep copy the net, keeping the simulation attributes of its places, transitions and arcs """
+        memodict = {} if memodict is None else memodict
+        this_copy: SimPetriNet = SimPetriNet(self.name, properties=deepcopy(self.properties, memodict))
+        memodict[id(self)] = this_copy
+        for place in self.indexed_places():
+            place_copy = SimPetriNet.SimPlace(place.name, properties=deepcopy(place.properties, memodict))
+            this_copy.add_place(place_copy)
+            memodict[id(place)] = place_copy
+        for trans in self.indexed_transitions():
+            trans_copy = SimPetriNet.SimTransition(
+                trans.name, trans.label,
+                duration=trans.duration,
+                attributes=deepcopy(trans.attributes, memodict),
+                resources=deepcopy(trans.resources, memodict),
+                on_fire_callback=trans.on_fire_callback,
+                properties=deepcopy(trans.properties, memodict)
+            )
+            this_copy.add_transition(trans_copy)
+            memodict[id(trans)] = trans_copy
+        for arc in self.arcs:
+            this_copy.add_arc(SimPetriNet.SimArc(
+                memodict[id(arc.source)], memodict[id(arc.target)], arc.weight,
+                properties=deepcopy(arc.properties, memodict)
+            ))
+        return this_copy
+
+    def indexed_places(self) -> List['SimPetriNet.SimPlace']:
+        """ Return the places ordered by index, places added to the set directly are indexed first """
+        if len(self._place_order) != len(self.places):
+            self._place_order = _reindex(self.places, self._place_order)
+        return self._place_order
+
+    def indexed_transitions(self) -> List['SimPetriNet.SimTransition']:
+        """ Return the transitions ordered by index, transitions added to the set directly are indexed first """
+        if len(self._transition_order) != len(self.transitions):
+            self._transition_order = _reindex(self.transitions, self._transition_order)
+        return self._transition_order
 
     class SimArc(PetriNet.Arc):
         def __init__(self,
@@ -68,8 +163,12 @@ class SimPetriNet(pm4py.PetriNet):
                      out_arcs: Optional[List["SimPetriNet.SimArc"]] = None,
                      properties: dict = None):
             super().__init__(name, in_arcs, out_arcs, properties)
+            self._idx: int = -1
 
     class SimTransition(PetriNet.Transition):
+        # Counts the changes of resources and callbacks of all transitions, generators specialized to them compare it
+        firing_version: int = 0
+
         def __init__(self,
                      name: str,
                      label: str,
@@ -81,18 +180,42 @@ class SimPetriNet(pm4py.PetriNet):
                      out_arcs: Optional[List["SimPetriNet.SimArc"]] = None,
                      properties: dict = None):
             super().__init__(name, label, in_arcs, out_arcs, properties)
+            self._idx: int = -1
             self.duration = duration
             self.attributes: dict[str, Any] = attributes if attributes is not None else {}
             self.on_fire_callback: Optional[Callable[[Marking, int, Self], None]] = on_fire_callback
             self.resources: List[BaseResource] = resources if resources is not None else []
+            # Frozen (place, weight) pairs of the in- and out-arcs, see freeze_transition
+            self._preset: Optional[Tuple[Tuple[PetriNet.Place, int], ...]] = None
+            self._postset: Optional[Tuple[Tuple[PetriNet.Place, int], ...]] = None
+
+        @property
+        def resources(self) -> List[BaseResource]:
+            """ Resources needed to fire the transition, assign a new list to change them """
+            return self._resources
+
+        @resources.setter
+        def resources(self, resources: List[BaseResource]) -> None:
+            self._resources = resources
+            SimPetriNet.SimTransition.firing_version += 1
+
+        @property
+        def on_fire_callback(self) -> Optional[Callable[[Marking, int, Self], None]]:
+            """ Called with the marking, the case id and the transition after the transition fired """
+            return self._on_fire_callback
+
+        @on_fire_callback.setter
+        def on_fire_callback(self, on_fire_callback: Optional[Callable[[Marking, int, Self], None]]) -> None:
+            self._on_fire_callback = on_fire_callback
+            SimPetriNet.SimTransition.firing_version += 1
 
         def get_attributes(self) -> dict[str, Any]:
             """ Get attributes for the transition """
             return self.attributes
 
         def update_attributes(self, attributes: dict[str, Any]):
-            """ Update attributes for the transition """
-            self.attributes.update(attributes)
+            """ Update attributes for the transition, copying them first as they may be shared with other transitions """
+            self.attributes = {**self.attributes, **attributes}
 
         def all_resources_available(self) -> bool:
             """ Check if all resources are available """
@@ -114,11 +237,123 @@ def add_sim_arc_from_to(fr, to, net: SimPetriNet, weight=1) -> SimPetriNet.SimAr
     -------
     None
     """
-    a = SimPetriNet.SimArc(fr, to, weight)
-    net.arcs.add(a)
-    fr.out_arcs.add(a)
-    to.in_arcs.add(a)
-    return a
+    return net.add_arc(SimPetriNet.SimArc(fr, to, weight))
+
+
+def freeze_transition(t: SimPetriNet.SimTransition) -> None:
+    """ Snapshot the (place, weight) pairs of the in- and out-arcs of a transition as tuples """
+    t._preset = tuple((a.source, a.weight) for a in t.in_arcs)
+    t._postset = tuple((a.target, a.weight) for a in t.out_arcs)
+
+
+def transition_arcs(t: PetriNet.Transition) -> Tuple[Tuple[Tuple[PetriNet.Place, int], ...],
+                                                      Tuple[Tuple[PetriNet.Place, int], ...]]:
+    """
+    Return the (place, weight) pairs of the preset and postset of a transition
+
+    SimTransitions are frozen on first use, plain pm4py transitions carry no snapshot and are read from their arcs,
+    since arcs added through pm4py's utilities would not invalidate it.
+    """
+    if not isinstance(t, SimPetriNet.SimTransition):
+        return (tuple((a.source, a.weight) for a in t.in_arcs),
+                tuple((a.target, a.weight) for a in t.out_arcs))
+    if t._preset is None or t._postset is None:
+        freeze_transition(t)
+    return t._preset, t._postset
+
+
+class NetArrays(NamedTuple):
+    """
+    Integer encoding of a Petri net topology as CSR arrays (places and transitions are indexed by position)
+    """
+    places: List[SimPetriNet.SimPlace]
+    transitions: List[SimPetriNet.SimTransition]
+    place_index: Dict[SimPetriNet.SimPlace, int]
+    t_in_ptr: np.ndarray
+    t_in_place: np.ndarray
+    t_in_w: np.ndarray
+    t_out_ptr: np.ndarray
+    t_out_place: np.ndarray
+    t_out_w: np.ndarray
+    t_is_visible: np.ndarray
+    p_cons_ptr: np.ndarray
+    p_cons_trans: np.ndarray
+
+    def marking_to_array(self, m: Optional[Marking]) -> np.ndarray:
+        """ Convert a marking into a token count vector indexed by place id """
+        vec: np.ndarray = np.zeros(len(self.places), dtype=np.int32)
+        if m is not None:
+            for p, tokens in m.items():
+                vec[self.place_index[p]] = tokens
+        return vec
+
+
+def build_net_arrays(net: SimPetriNet) -> NetArrays:
+    """
+    Index the places and transitions of a net and encode its arcs as CSR arrays.
+
+    The in-arcs of transition i are t_in_place[t_in_ptr[i]:t_in_ptr[i + 1]] with the weights
+    t_in_w[t_in_ptr[i]:t_in_ptr[i + 1]], the out-arcs are stored the same way in the t_out_* arrays.
+    The inverse index lists the transitions consuming from place p in p_cons_trans[p_cons_ptr[p]:p_cons_ptr[p + 1]].
+    """
+    if isinstance(net, SimPetriNet):
+        places: List[SimPetriNet.SimPlace] = net.indexed_places()
+        transitions: List[SimPetriNet.SimTransition] = net.indexed_transitions()
+    else:
+        places = list(net.places)
+        transitions = list(net.transitions)
+    place_index: Dict[SimPetriNet.SimPlace, int] = {p: i for i, p in enumerate(places)}
+
+    t_in_ptr: np.ndarray = np.zeros(len(transitions) + 1, dtype=np.int32)
+    t_out_ptr: np.ndarray = np.zeros(len(transitions) + 1, dtype=np.int32)
+    in_place: List[int] = []
+    in_w: List[int] = []
+    out_place: List[int] = []
+    out_w: List[int] = []
+
+    for i, t in enumerate(transitions):
+        for a in t.in_arcs:
+            in_place.append(place_index[a.source])
+            in_w.append(a.weight)
+        for a in t.out_arcs:
+            out_place.append(place_index[a.target])
+            out_w.append(a.weight)
+        t_in_ptr[i + 1] = len(in_place)
+        t_out_ptr[i + 1] = len(out_place)
+
+    # Inverse index: group the transition ids of the in-arcs by their source place
+    t_in_place: np.ndarray = np.array(in_place, dtype=np.int32)
+    in_arc_trans: np.ndarray = np.repeat(np.arange(len(transitions), dtype=np.int32), np.diff(t_in_ptr))
+    p_cons_ptr: np.ndarray = np.zeros(len(places) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(t_in_place, minlength=len(places)), out=p_cons_ptr[1:])
+
+    return NetArrays(
+        places=places,
+        transitions=transitions,
+        place_index=place_index,
+        t_in_ptr=t_in_ptr,
+        t_in_place=t_in_place,
+        t_in_w=np.array(in_w, dtype=np.int32),
+        t_out_ptr=t_out_ptr,
+        t_out_place=np.array(out_place, dtype=np.int32),
+        t_out_w=np.array(out_w, dtype=np.int32),
+        t_is_visible=np.array([t.label is not None for t in transitions], dtype=np.bool_),
+        p_cons_ptr=p_cons_ptr,
+        p_cons_trans=in_arc_trans[np.argsort(t_in_place, kind='stable')]
+    )
+
+
+def freeze(net: SimPetriNet) -> NetArrays:
+    """
+    Freeze the topology of a net before simulating it: the arcs of every transition are snapshotted as tuples
+    (used by ClassicPetriNetSemantics) and the net is encoded as CSR arrays (used by the compiled playout).
+
+    Arcs added afterward with add_sim_arc_from_to invalidate the snapshot of the connected transition.
+    """
+    for t in net.transitions:
+        freeze_transition(t)
+    return build_net_arrays(net)
+
 
 class BaseSemantics(abc.ABC):
     @abc.abstractmethod
@@ -137,44 +372,40 @@ class BaseSemantics(abc.ABC):
 class ClassicPetriNetSemantics(BaseSemantics):
     def is_enabled(self, t: SimPetriNet.SimTransition, pn: SimPetriNet, m: Marking, **kwargs) -> bool:
         """ Check if the transition is enabled in the Petri net with strong semantics """
-        if t in pn.transitions:
-            for a in t.in_arcs:
-                if m[a.source] < a.weight:
-                    return False
-            return True
-        return False
+        preset, _ = transition_arcs(t)
+        for p, w in preset:
+            if m[p] < w:
+                return False
+        return True
 
     def execute(self, t: SimPetriNet.SimTransition, pn: SimPetriNet, m: Marking, **kwargs) -> Optional[Marking]:
         """ Execute the transition in the Petri net with strong semantics """
         if not self.is_enabled(t, pn, m):
             return None
 
+        preset, postset = transition_arcs(t)
         m_out: Marking = copy(m)
-        a: SimPetriNet.SimArc
-        for a in t.in_arcs:
-            m_out[a.source] -= a.weight
-            if m_out[a.source] == 0:
-                del m_out[a.source]
+        for p, w in preset:
+            m_out[p] -= w
+            if m_out[p] == 0:
+                del m_out[p]
 
-        a: SimPetriNet.SimArc
-        for a in t.out_arcs:
-            m_out[a.target] += a.weight
+        for p, w in postset:
+            m_out[p] += w
 
         return m_out
 
     def weak_execute(self, t: SimPetriNet.SimTransition, pn: SimPetriNet, m: Marking, **kwargs) -> Marking:
         """ Execute the transition in the Petri net with weak semantics """
+        preset, postset = transition_arcs(t)
         m_out: Marking = copy(m)
+        for p, w in preset:
+            m_out[p] -= w
+            if m_out[p] <= 0:
+                del m_out[p]
 
-        a: SimPetriNet.SimArc
-        for a in t.in_arcs:
-            m_out[a.source] -= a.weight
-            if m_out[a.source] <= 0:
-                del m_out[a.source]
-
-        a: SimPetriNet.SimArc
-        for a in t.out_arcs:
-            m_out[a.target] += a.weight
+        for p, w in postset:
+            m_out[p] += w
         return m_out
 
     def enabled_transitions(self, pn: SimPetriNet, m: Marking, **kwargs) -> Set[SimPetriNet.SimTransition]:
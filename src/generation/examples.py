@@ -1,12 +1,60 @@
+import functools
+from copy import deepcopy
 from datetime import timedelta, datetime
-from typing import List
+from typing import List, Callable, TypeVar, Any
 
 from pm4py import Marking
 
-from src.generation.constants import SimPetriNet, add_sim_arc_from_to, BaseResource, RobotArm
+from src.generation.constants import SimPetriNet, BaseResource, RobotArm
 from faker import Faker
+
+T = TypeVar("T")
+
+
+def _memoized(factory: Callable[[], T]) -> Callable[[], T]:
+    """Build the result of a net factory once and return a deep copy of it on every call"""
+    cached: Callable[[], T] = functools.lru_cache(maxsize=1)(factory)
+
+    @functools.wraps(factory)
+    def wrapper() -> T:
+        # The simulation mutates the resources and markings, so every caller gets its own copy
+        return deepcopy(cached())
+
+    return wrapper
+
+
+@functools.lru_cache(maxsize=1)
+def _faker() -> Faker:
+    """Return the German Faker of the examples, with its own random generator so that Faker's shared one is kept"""
+    faker = Faker("de_DE")
+    faker.seed_instance()
+    return faker
+
+
 def create_online_order_net() -> tuple[SimPetriNet, Marking, Marking]:
     """Create a Petri net modeling an online order process."""
+    net, initial_marking, final_marking = _online_order_net()
+
+    faker = _faker()
+    city: str = faker.city()
+    name: str = faker.name()
+    address: str = faker.address()
+
+    # All transitions share one attribute dict, update_attributes copies it before changing a single one
+    shared_attributes: dict[str, Any] = {
+        "location": city,
+        "name": name,
+        "address": address
+    }
+    for transition in net.transitions:
+        transition.attributes = shared_attributes
+
+    return net, initial_marking, final_marking
+
+
+@_memoized
+def _online_order_net() -> tuple[SimPetriNet, Marking, Marking]:
+    """Create the online order net without attributes, they are drawn anew for every copy"""
     net = SimPetriNet("ONLINE ORDER")
 
     # Define places
@@ -29,7 +77,7 @@ def create_online_order_net() -> tuple[SimPetriNet, Marking, Marking]:
 
     # Add places to net
     for place in places.values():
-        net.places.add(place)
+        net.add_place(place)
 
     # Define transitions
     transitions: dict[str: SimPetriNet.SimTransition] = {
@@ -50,59 +98,45 @@ def create_online_order_net() -> tuple[SimPetriNet, Marking, Marking]:
         "t15": SimPetriNet.SimTransition("t15", "Mark credit card details as incorrect", duration=timedelta(seconds=5))
     }
 
-    faker = Faker("de_DE")
-    city: str = faker.city()
-    name: str = faker.name()
-    address: str = faker.address()
-
     # Add transitions to net
     for transition in transitions.values():
-        transition.update_attributes({
-            "location": city,
-            "name": name,
-            "address": address
-        })
-        net.transitions.add(transition)
+        net.add_transition(transition)
 
     # Create arcs
-    arcs: List[SimPetriNet.SimArc] = [
-        add_sim_arc_from_to(places["p1"], transitions["t1"], net),
-        add_sim_arc_from_to(transitions["t1"], places["p2"], net),
-        add_sim_arc_from_to(places["p2"], transitions["t2"], net),
-        add_sim_arc_from_to(transitions["t2"], places["p3"], net),
-        add_sim_arc_from_to(places["p3"], transitions["t3"], net),
-        add_sim_arc_from_to(places["p3"], transitions["t5"], net),
-        add_sim_arc_from_to(transitions["t3"], places["p4"], net),
-        add_sim_arc_from_to(places["p4"], transitions["t4"], net),
-        add_sim_arc_from_to(transitions["t4"], places["p5"], net),
-        add_sim_arc_from_to(transitions["t5"], places["p5"], net),
-        add_sim_arc_from_to(places["p5"], transitions["t6"], net),
-        add_sim_arc_from_to(transitions["t6"], places["p6"], net),
-        add_sim_arc_from_to(places["p6"], transitions["t7"], net),
-        add_sim_arc_from_to(transitions["t7"], places["p7"], net),
-        add_sim_arc_from_to(places["p7"], transitions["t8"], net),
-        add_sim_arc_from_to(transitions["t8"], places["p6"], net),
-        add_sim_arc_from_to(places["p7"], transitions["t9"], net),
-        add_sim_arc_from_to(transitions["t9"], places["p9"], net),
-        add_sim_arc_from_to(places["p9"], transitions["t11"], net),
-        add_sim_arc_from_to(transitions["t11"], places["p10"], net),
-        add_sim_arc_from_to(places["p10"], transitions["t14"], net),
-        add_sim_arc_from_to(transitions["t14"], places["p11"], net),
-        add_sim_arc_from_to(places["p11"], transitions["t12"], net),
-        add_sim_arc_from_to(places["p11"], transitions["t15"], net),
-        add_sim_arc_from_to(transitions["t15"], places["p9"], net),
-        add_sim_arc_from_to(transitions["t9"], places["p8"], net),
-        add_sim_arc_from_to(places["p8"], transitions["t10"], net),
-        add_sim_arc_from_to(transitions["t10"], places["p13"], net),
-        add_sim_arc_from_to(places["p13"], transitions["t13"], net),
-        add_sim_arc_from_to(transitions["t12"], places["p12"], net),
-        add_sim_arc_from_to(places["p12"], transitions["t13"], net),
-        add_sim_arc_from_to(transitions["t13"], places["p14"], net)
-    ]
-
-    # Add arcs to net
-    for arc in arcs:
-        net.arcs.add(arc)
+    net.add_arcs_from([
+        (places["p1"], transitions["t1"]),
+        (transitions["t1"], places["p2"]),
+        (places["p2"], transitions["t2"]),
+        (transitions["t2"], places["p3"]),
+        (places["p3"], transitions["t3"]),
+        (places["p3"], transitions["t5"]),
+        (transitions["t3"], places["p4"]),
+        (places["p4"], transitions["t4"]),
+        (transitions["t4"], places["p5"]),
+        (transitions["t5"], places["p5"]),
+        (places["p5"], transitions["t6"]),
+        (transitions["t6"], places["p6"]),
+        (places["p6"], transitions["t7"]),
+        (transitions["t7"], places["p7"]),
+        (places["p7"], transitions["t8"]),
+        (transitions["t8"], places["p6"]),
+        (places["p7"], transitions["t9"]),
+        (transitions["t9"], places["p9"]),
+        (places["p9"], transitions["t11"]),
+        (transitions["t11"], places["p10"]),
+        (places["p10"], transitions["t14"]),
+        (transitions["t14"], places["p11"]),
+        (places["p11"], transitions["t12"]),
+        (places["p11"], transitions["t15"]),
+        (transitions["t15"], places["p9"]),
+        (transitions["t9"], places["p8"]),
+        (places["p8"], transitions["t10"]),
+        (transitions["t10"], places["p13"]),
+        (places["p13"], transitions["t13"]),
+        (transitions["t12"], places["p12"]),
+        (places["p12"], transitions["t13"]),
+        (transitions["t13"], places["p14"])
+    ])
 
     # Define initial marking (start with 1 token in p1)
     initial_marking = Marking()
@@ -115,6 +149,7 @@ def create_online_order_net() -> tuple[SimPetriNet, Marking, Marking]:
     return net, initial_marking, final_marking
 
 
+@_memoized
 def create_order_process_net() -> tuple[SimPetriNet, Marking, Marking]:
     """Create a simple order processing Petri net."""
     net = SimPetriNet("Order Process")
@@ -128,7 +163,7 @@ def create_order_process_net() -> tuple[SimPetriNet, Marking, Marking]:
 
     # Add places to net
     for p in [start, order_received, payment_pending, order_confirmed, end]:
-        net.places.add(p)
+        net.add_place(p)
 
     # Create transitions with labels
     receive_order = SimPetriNet.SimTransition("t_receive", "Receive Order")
@@ -138,23 +173,19 @@ def create_order_process_net() -> tuple[SimPetriNet, Marking, Marking]:
 
     # Add transitions to net
     for t in [receive_order, check_payment, confirm_order, complete_order]:
-        net.transitions.add(t)
+        net.add_transition(t)
 
     # Create arcs
-    arcs: List[SimPetriNet.SimArc] = [
-        add_sim_arc_from_to(start, receive_order, net),
-        add_sim_arc_from_to(receive_order, order_received, net),
-        add_sim_arc_from_to(order_received, check_payment, net),
-        add_sim_arc_from_to(check_payment, payment_pending, net),
-        add_sim_arc_from_to(payment_pending, confirm_order, net),
-        add_sim_arc_from_to(confirm_order, order_confirmed, net),
-        add_sim_arc_from_to(order_confirmed, complete_order, net),
-        add_sim_arc_from_to(complete_order, end, net)
-    ]
-
-    # Add arcs to net
-    for arc in arcs:
-        net.arcs.add(arc)
+    net.add_arcs_from([
+        (start, receive_order),
+        (receive_order, order_received),
+        (order_received, check_payment),
+        (check_payment, payment_pending),
+        (payment_pending, confirm_order),
+        (confirm_order, order_confirmed),
+        (order_confirmed, complete_order),
+        (complete_order, end)
+    ])
 
     # Define initial marking (5 process instances will be started)
     initial_marking = Marking()
@@ -166,6 +197,7 @@ def create_order_process_net() -> tuple[SimPetriNet, Marking, Marking]:
     return net, Marking(initial_marking), Marking(final_marking)
 
 
+@_memoized
 def example_mutualistic_net() -> List[tuple[SimPetriNet, Marking, Marking]]:
     """
     Create a Petri net modeling a mutualistic relationship.
@@ -205,7 +237,7 @@ def example_mutualistic_net() -> List[tuple[SimPetriNet, Marking, Marking]]:
 
     # Add places to net
     for place in places_a.values():
-        net_a.places.add(place)
+        net_a.add_place(place)
 
     # Define transitions
     transitions_a: dict[str: SimPetriNet.SimTransition] = {
@@ -217,21 +249,17 @@ def example_mutualistic_net() -> List[tuple[SimPetriNet, Marking, Marking]]:
 
     # Add transitions to net
     for transition in transitions_a.values():
-        net_a.transitions.add(transition)
+        net_a.add_transition(transition)
 
     # Create arcs
-    arcs_a: List[SimPetriNet.SimArc] = [
-        add_sim_arc_from_to(places_a["p1"], transitions_a["t1"], net_a),
-        add_sim_arc_from_to(transitions_a["t1"], places_a["p2"], net_a),
-        add_sim_arc_from_to(places_a["p2"], transitions_a["t2"], net_a),
-        add_sim_arc_from_to(transitions_a["t2"], places_a["p3"], net_a),
-        add_sim_arc_from_to(places_a["p3"], transitions_a["t3"], net_a),
-        add_sim_arc_from_to(transitions_a["t3"], places_a["p4"], net_a)
-    ]
-
-    # Add arcs to net
-    for arc in arcs_a:
-        net_a.arcs.add(arc)
+    net_a.add_arcs_from([
+        (places_a["p1"], transitions_a["t1"]),
+        (transitions_a["t1"], places_a["p2"]),
+        (places_a["p2"], transitions_a["t2"]),
+        (transitions_a["t2"], places_a["p3"]),
+        (places_a["p3"], transitions_a["t3"]),
+        (transitions_a["t3"], places_a["p4"])
+    ])
 
     # Define initial marking (start with 1 token in p1)
     initial_a = Marking()
@@ -252,7 +280,7 @@ def example_mutualistic_net() -> List[tuple[SimPetriNet, Marking, Marking]]:
 
     # Add places to net
     for place in places_b.values():
-        net_b.places.add(place)
+        net_b.add_place(place)
 
 
     # Define transitions
@@ -263,27 +291,23 @@ def example_mutualistic_net() -> List[tuple[SimPetriNet, Marking, Marking]]:
         "t4": SimPetriNet.SimTransition("t4", "Report robot availability", duration=timedelta(seconds=5), resources=[res_robot_arm])
     }
 
-    transitions_b["t2"].on_fire_callback = lambda marking, time, tr: res_robot_arm.acquire()
-    transitions_b["t4"].on_fire_callback = lambda marking, time, tr: res_robot_arm.release(datetime.now())
+    # The callbacks use the resource of the fired transition, so that they stay valid on copies of the net
+    transitions_b["t2"].on_fire_callback = lambda marking, time, tr: tr.resources[0].acquire()
+    transitions_b["t4"].on_fire_callback = lambda marking, time, tr: tr.resources[0].release(datetime.now())
 
     # Add transitions to net
     for transition in transitions_b.values():
-        net_b.transitions.add(transition)
+        net_b.add_transition(transition)
 
     # Create arcs
-    arcs_b: List[SimPetriNet.SimArc] = [
-        add_sim_arc_from_to(places_b["p1"], transitions_b["t1"], net_b),
-        add_sim_arc_from_to(transitions_b["t1"], places_b["p2"], net_b),
-        add_sim_arc_from_to(places_b["p2"], transitions_b["t2"], net_b),
-        add_sim_arc_from_to(transitions_b["t2"], places_b["p3"], net_b),
-        add_sim_arc_from_to(places_b["p3"], transitions_b["t3"], net_b),
-        add_sim_arc_from_to(transitions_b["t3"], places_b["p4"], net_b)
-    ]
-
-    # Add arcs to net
-
-    for arc in arcs_b:
-        net_b.arcs.add(arc)
+    net_b.add_arcs_from([
+        (places_b["p1"], transitions_b["t1"]),
+        (transitions_b["t1"], places_b["p2"]),
+        (places_b["p2"], transitions_b["t2"]),
+        (transitions_b["t2"], places_b["p3"]),
+        (places_b["p3"], transitions_b["t3"]),
+        (transitions_b["t3"], places_b["p4"])
+    ])
 
     # Define initial marking (start with 1 token in p1)
     initial_b = Marking()
@@ -1,21 +1,28 @@
-import abc
 import datetime
-import math
-from collections import defaultdict
+import random
+import time
 from copy import copy
-from random import choice
-from typing import Optional, Generator, Iterator, Union, Tuple, Any, Set, List, Dict
+from random import Random
+from typing import Optional, Iterator, Tuple, Any, Set, List, Dict, Callable, Sequence
 
+import numpy as np
 from pm4py.objects.log.obj import Event
 from pm4py.objects.petri_net.obj import Marking
 from pm4py.util import xes_constants
 
 import uuid
-from src.generation.constants import SimPetriNet, ClassicPetriNetSemantics, BaseSemantics, BaseResource, RobotArm
+from src.generation._sim_numba import _init_enabled, _fire_incremental, _run_until_visible, _select_transitions, \
+    DEADLOCK, STOP
+from src.generation.constants import SimPetriNet, ClassicPetriNetSemantics, BaseSemantics, BaseResource, NetArrays, \
+    freeze
 from typing import Final
 from tabulate import tabulate
 from concurrent.futures import ThreadPoolExecutor
 
+# Reference of the integer nanosecond timestamps of the generator
+_EPOCH: Final[datetime.datetime] = datetime.datetime(1970, 1, 1)
+
+
 class PetriNetEventGenerator:
     """Generator class for continuous Petri net simulation"""
 
@@ -32,7 +39,8 @@ class PetriNetEventGenerator:
             initial_case_id: int = 0,
             initial_timestamp: Optional[datetime.datetime] = None,
             add_only_if_fm_is_reached: bool = False,
-            fm_leq_accepted: bool = False
+            fm_leq_accepted: bool = False,
+            seed: Optional[int] = None
     ):
         """
         Initialize the Petri net event generator.
@@ -45,11 +53,12 @@ class PetriNetEventGenerator:
             activity_key: Key for activity name in events
             timestamp_key: Key for timestamp in events
             case_id_key: Key for case ID in events
-            petri_net_semantics: Petri net semantics to use
+            petri_net_semantics: Petri net semantics to use, classic semantics run in the compiled token game
             initial_case_id: Starting case ID number
             initial_timestamp: Starting timestamp (defaults to current time)
             add_only_if_fm_is_reached: Only generate events for traces reaching final marking
             fm_leq_accepted: Accept traces ending in supersets of final marking
+            seed: Optional seed of the simulation, drawn from the random module otherwise
         """
         # Initialize parameters
         self.net: SimPetriNet = net
@@ -61,54 +70,180 @@ class PetriNetEventGenerator:
         self.case_id_key: str = case_id_key
         self.petri_net_semantics: BaseSemantics = petri_net_semantics
         self.current_case_id: int = initial_case_id
-        self.current_timestamp: datetime.datetime = initial_timestamp or datetime.datetime.now()
+        # Time is kept as integer nanoseconds of the wall clock, the UTC offset of an aware timestamp is only
+        # appended when formatting
+        initial_timestamp = initial_timestamp or datetime.datetime.now()
+        self._tz_suffix: str = initial_timestamp.isoformat()[len(initial_timestamp.replace(tzinfo=None).isoformat()):]
+        self._tzinfo: Optional[datetime.tzinfo] = initial_timestamp.tzinfo
+        self._current_ns: int = 0
+        self.current_timestamp = initial_timestamp
         self.add_only_if_fm_is_reached: bool = add_only_if_fm_is_reached
         self.fm_leq_accepted: bool = fm_leq_accepted
+        self._has_fm: bool = final_marking is not None
 
         # Unique ID prefix for the case notion (dont change in runtime)
         self.UNIQUE_ID_PREFIX: Final[str] = str(uuid.uuid4())[:8]
+        self._case_prefix: str = self.UNIQUE_ID_PREFIX + "_"
+
+        # CSR encoding of the net, the token game runs on a token count vector indexed by place id
+        self._arrays: NetArrays = freeze(net)
+        self._transitions: List[SimPetriNet.SimTransition] = self._arrays.transitions
+        self._initial_marking_array: np.ndarray = self._arrays.marking_to_array(initial_marking)
+        self._final_marking_array: np.ndarray = self._arrays.marking_to_array(final_marking)
+        # Event of every visible transition without time, case and attributes, the keys keep the order of the
+        # emitted events. The attributes are read when the event is created, they may change during the simulation
+        self._durations_ns: List[int] = [t.duration // datetime.timedelta(microseconds=1) * 1000
+                                         for t in self._transitions]
+        self._event_templates: List[Optional[Dict[str, Any]]] = [
+            {
+                activity_key: t.label,
+                timestamp_key: None,
+                "case:concept:name": None
+            } if t.label is not None else None
+            for t in self._transitions
+        ]
+        # Transitions the compiled loop hands back and the firing of the net, see _specialize
+        self._t_stop: np.ndarray = np.zeros(len(self._transitions), dtype=np.bool_)
+        self._fire: Callable[[int], bool] = self._fire_unchecked
+        self._firing_version: int = -1
+        # Other semantics are executed by their own enabled_transitions/execute in the Python loop, the token count
+        # vector then only mirrors their marking
+        self._compiled: bool = type(petri_net_semantics) is ClassicPetriNetSemantics
+        self._python_marking: Marking = copy(initial_marking)
+        self._transition_ids: Dict[SimPetriNet.SimTransition, int] = {t: i for i, t in enumerate(self._transitions)}
+        if not self._compiled:
+            self._next_visible_transition = self._next_visible_python
+        self._specialize()
+        # Enabled set of the current marking, kept up to date while firing (see _init_enabled)
+        self._enabled: np.ndarray = np.empty(len(self._transitions), dtype=np.int32)
+        self._enabled_pos: np.ndarray = np.empty(len(self._transitions), dtype=np.int32)
+        self._n_enabled: np.ndarray = np.zeros(1, dtype=np.int32)
+        # Scalar draws are much cheaper with random.Random than with a numpy Generator, without a seed it is seeded
+        # from the random module so that random.seed still makes the simulation reproducible
+        self._rng: Random = Random(seed if seed is not None else random.getrandbits(64))
+        self._rng_state: np.ndarray = np.array([self._rng.getrandbits(64)], dtype=np.uint64)
 
         # State for current trace
-        self.current_marking: Optional[Marking] = None
+        self._marking: np.ndarray = np.zeros(len(self._arrays.places), dtype=np.int32)
+        self._callback_marking: Marking = Marking()
         self.visible_transitions_count: int = 0
         self._initialize_trace()
 
+    @property
+    def current_timestamp(self) -> datetime.datetime:
+        """Return the current time of the generator"""
+        return (_EPOCH + datetime.timedelta(microseconds=self._current_ns // 1000)).replace(tzinfo=self._tzinfo)
+
+    @current_timestamp.setter
+    def current_timestamp(self, timestamp: datetime.datetime) -> None:
+        """Set the current time of the generator"""
+        self._current_ns = (timestamp.replace(tzinfo=None) - _EPOCH) // datetime.timedelta(microseconds=1) * 1000
+
+    def _format_timestamp(self, timestamp_ns: int) -> str:
+        """Format a nanosecond timestamp as ISO string"""
+        timestamp: datetime.datetime = _EPOCH + datetime.timedelta(microseconds=timestamp_ns // 1000)
+        return timestamp.isoformat(timespec='microseconds') + self._tz_suffix
+
+    def _format_timestamps(self, timestamps_ns: np.ndarray) -> List[str]:
+        """Format nanosecond timestamps as ISO strings"""
+        formatted: List[str] = np.datetime_as_string(timestamps_ns.astype('datetime64[ns]'), unit='us').tolist()
+        if self._tz_suffix:
+            return [timestamp + self._tz_suffix for timestamp in formatted]
+        return formatted
+
+    @property
+    def current_marking(self) -> Marking:
+        """Return the current marking of the generator as a pm4py marking"""
+        places: List[SimPetriNet.SimPlace] = self._arrays.places
+        return Marking({places[p]: int(self._marking[p]) for p in np.flatnonzero(self._marking)})
+
+    def _refresh_callback_marking(self) -> Marking:
+        """Refill the marking handed to the on-fire callbacks, the same instance is reused for every firing"""
+        marking: Marking = self._callback_marking
+        marking.clear()
+        places: List[SimPetriNet.SimPlace] = self._arrays.places
+        for p in np.flatnonzero(self._marking).tolist():
+            marking[places[p]] = int(self._marking[p])
+        return marking
+
+    def _share_state(self, marking: np.ndarray, final_marking: np.ndarray, enabled: np.ndarray,
+                     n_enabled: np.ndarray, rng_state: np.ndarray) -> None:
+        """Move the simulation state into the given (possibly longer) views, e.g. rows of arrays shared by agents"""
+        n_places: int = len(self._marking)
+        n_transitions: int = len(self._transitions)
+        marking[:n_places] = self._marking
+        final_marking[:n_places] = self._final_marking_array
+        enabled[:n_transitions] = self._enabled
+        n_enabled[:] = self._n_enabled
+        rng_state[:] = self._rng_state
+        self._marking = marking[:n_places]
+        self._final_marking_array = final_marking[:n_places]
+        self._enabled = enabled[:n_transitions]
+        self._n_enabled = n_enabled
+        self._rng_state = rng_state
+
     def _get_current_state(self) -> Tuple[Marking, int]:
         """Return the current state of the generator"""
         return self.current_marking, self.current_case_id
 
+    def _specialize(self) -> None:
+        """
+        Specialize firing to the resources and callbacks of the transitions
+
+        Called once the resources or callbacks of a transition were set, see SimTransition.firing_version.
+        """
+        self._firing_version = SimPetriNet.SimTransition.firing_version
+        needs_checks: bool = False
+        for i, t in enumerate(self._transitions):
+            checked: bool = len(t.resources) > 0 or t.on_fire_callback is not None
+            # The compiled loop hands back visible transitions and those with resources or a callback
+            self._t_stop[i] = t.label is not None or checked
+            needs_checks = needs_checks or checked
+        if not self._compiled:
+            self._fire = self._fire_python
+        else:
+            # Resources and callbacks are only checked if some transition has them
+            self._fire = self._fire_checked if needs_checks else self._fire_unchecked
+
     def _initialize_trace(self) -> None:
         """Initialize state for a new trace"""
-        self.current_marking = copy(self.initial_marking)
+        np.copyto(self._marking, self._initial_marking_array)
+        if self._compiled:
+            arrays: NetArrays = self._arrays
+            self._n_enabled[0] = _init_enabled(self._marking, arrays.t_in_ptr, arrays.t_in_place, arrays.t_in_w,
+                                               self._enabled, self._enabled_pos)
+        else:
+            self._python_marking = copy(self.initial_marking)
         self.visible_transitions_count = 0
 
-    def _is_trace_acceptable(self, marking: Marking) -> bool:
+    def _is_trace_acceptable(self, marking: np.ndarray) -> bool:
         """Check if current trace meets acceptance criteria"""
         return (
                 not self.add_only_if_fm_is_reached or
-                self.final_marking == marking or
-                (self.final_marking is not None and self.final_marking <= marking and self.fm_leq_accepted)
+                (self._has_fm and (
+                        np.array_equal(self._final_marking_array, marking) or
+                        (self.fm_leq_accepted and bool(np.all(self._final_marking_array <= marking)))))
         )
 
-    def _fire_transition(self, enabled_transitions: set[SimPetriNet.SimTransition]) \
-            -> Optional[SimPetriNet.SimTransition]:
-        """Select next transition based on current state"""
-        if (self.final_marking is not None and
-                self.final_marking <= self.current_marking and
-                (self.final_marking == self.current_marking or self.fm_leq_accepted)):
-            return choice(list(enabled_transitions.union({None})))
-        return choice(list(enabled_transitions))
-
-    def _should_start_new_trace(self) -> bool:
-        """Check if we need to start a new trace based on current state"""
+    def _final_marking_reached(self) -> bool:
+        """Check if the trace may stop in the current marking"""
         return (
-                self.visible_transitions_count >= self.max_trace_length or
-                not self.petri_net_semantics.enabled_transitions(self.net, self.current_marking)
+                self._has_fm and
+                bool(np.all(self._final_marking_array <= self._marking)) and
+                (self.fm_leq_accepted or np.array_equal(self._final_marking_array, self._marking))
         )
 
+    def _fire_transition(self, enabled_transitions: Sequence[int], fm_reached: bool) -> Optional[int]:
+        """Select the id of the next transition based on current state, None stops the trace"""
+        n_enabled: int = len(enabled_transitions)
+        if fm_reached:
+            k: int = self._rng.randrange(n_enabled + 1)
+            return None if k == n_enabled else int(enabled_transitions[k])
+        return int(enabled_transitions[self._rng.randrange(n_enabled)])
+
     def _handle_invalid_trace(self) -> bool:
         """Handle invalid trace and return whether to continue iteration"""
-        if not self._is_trace_acceptable(self.current_marking):
+        if not self._is_trace_acceptable(self._marking):
             self._initialize_trace()
             self.current_timestamp = datetime.datetime.now()  # Reset timestamp
             return True
@@ -119,70 +254,162 @@ class PetriNetEventGenerator:
         self.current_case_id += 1
         self._initialize_trace()
 
-    def _handle_enabled_transition(self) -> Optional[set[SimPetriNet.SimTransition]]:
-        """Handle next transition and whether to continue iteration"""
-        enabled: set[SimPetriNet.SimTransition] = self.petri_net_semantics.enabled_transitions(self.net,
-                                                                                               self.current_marking)
-        return enabled
+    def _handle_enabled_transition(self) -> np.ndarray:
+        """Return the ids of the transitions enabled in the current marking"""
+        if not self._compiled:
+            return np.array(self._python_enabled(), dtype=np.int32)
+        return self._enabled[:self._n_enabled[0]].copy()
 
-    def _execute_transition(self, trans: Optional[SimPetriNet.SimTransition]) -> Optional[Event]:
-        """Execute the selected transition and return event if transition is visible"""
-        if trans is None:
-            self._start_new_trace()
-            return None
+    def _python_enabled(self) -> List[int]:
+        """Return the ids of the transitions the Python semantics enable in the current marking"""
+        enabled: Set[SimPetriNet.SimTransition] = self.petri_net_semantics.enabled_transitions(
+            self.net, self._python_marking
+        )
+        return [self._transition_ids[t] for t in enabled]
+
+    def _fire_unchecked(self, t: int) -> bool:
+        """Fire the transition, used for nets without resources and callbacks"""
+        arrays: NetArrays = self._arrays
+        self._n_enabled[0] = _fire_incremental(
+            t, self._marking, arrays.t_in_ptr, arrays.t_in_place, arrays.t_in_w,
+            arrays.t_out_ptr, arrays.t_out_place, arrays.t_out_w, arrays.p_cons_ptr, arrays.p_cons_trans,
+            self._enabled, self._enabled_pos, self._n_enabled[0]
+        )
+        return True
 
+    def _fire_checked(self, t: int) -> bool:
+        """Fire the transition if its resources are available, run its callback and return whether it fired"""
+        trans: SimPetriNet.SimTransition = self._transitions[t]
         if not trans.all_resources_available():
-            return None
+            return False
 
         # Execute transition and update marking
-        self.current_marking = self.petri_net_semantics.execute(trans, self.net, self.current_marking)
+        self._fire_unchecked(t)
 
         if trans.on_fire_callback is not None:
-            trans.on_fire_callback(self.current_marking, self.current_case_id, trans)
+            trans.on_fire_callback(self._refresh_callback_marking(), self.current_case_id, trans)
+        return True
 
-        # Return event if transition has a label
-        if trans.label is not None:
-            return self._create_event(trans)
-        return None
+    def _fire_python(self, t: int) -> bool:
+        """Fire the transition with the Python semantics if its resources are available and return whether it fired"""
+        trans: SimPetriNet.SimTransition = self._transitions[t]
+        if not trans.all_resources_available():
+            return False
 
-    def _create_event(self, trans: SimPetriNet.SimTransition) -> Event:
-        """Create an event from the executed transition"""
+        # Execute transition and update marking
+        self._python_marking = self.petri_net_semantics.execute(trans, self.net, self._python_marking)
+        np.copyto(self._marking, self._arrays.marking_to_array(self._python_marking))
+
+        if trans.on_fire_callback is not None:
+            trans.on_fire_callback(self._python_marking, self.current_case_id, trans)
+        return True
+
+    def _record_visible(self, t: int) -> None:
+        """Advance the trace length and the time after a visible transition fired"""
         self.visible_transitions_count += 1
-        self.current_timestamp += trans.duration
+        self._current_ns += self._durations_ns[t]
 
-        e_ref: Event = Event()
-        e_ref[self.activity_key] = trans.label
-        e_ref[self.timestamp_key] = self.current_timestamp.isoformat()
-        e_ref["case:concept:name"] = f"{self.UNIQUE_ID_PREFIX}_{str(self.current_case_id)}"
+    def _execute_transition(self, t: Optional[int]) -> Optional[Event]:
+        """Execute the selected transition and return event if transition is visible"""
+        if t is None:
+            self._start_new_trace()
+            return None
 
-        for key, value in trans.attributes.items():
-            e_ref["attr:" + key] = value
+        if self._firing_version != SimPetriNet.SimTransition.firing_version:
+            self._specialize()
+        if not self._fire(t):
+            return None
+
+        # Return event if transition has a label
+        if self._arrays.t_is_visible[t]:
+            self._record_visible(t)
+            return self._create_event(t, self._format_timestamp(self._current_ns), self.current_case_id)
+        return None
 
+    def _create_event(self, t: int, timestamp: Optional[str], case_id: int) -> Event:
+        """Create an event for a visible transition fired at the given ISO time in the given case"""
+        e_ref: Event = Event(self._event_templates[t])
+        e_ref[self.timestamp_key] = timestamp
+        e_ref["case:concept:name"] = self._case_prefix + str(case_id)
+        for key, value in self._transitions[t].attributes.items():
+            e_ref["attr:" + key] = value
         return e_ref
 
-    def __next__(self) -> Event:
-        """Generate next event in the Petri net simulation"""
+    def _next_visible_transition(self) -> int:
+        """Simulate up to the next visible transition, fire it and return its id"""
+        arrays: NetArrays = self._arrays
         while True:
-            # Check if we need to start a new trace
-            if self._should_start_new_trace():
-                # Handle invalid trace
-                if self._handle_invalid_trace():
-                    continue
-                # Start new trace
-                self._start_new_trace()
+            # The trace ends once it is long enough or no transition is enabled anymore
+            if self.visible_transitions_count >= self.max_trace_length or self._n_enabled[0] == 0:
+                # Handle invalid trace, otherwise start new trace
+                if not self._handle_invalid_trace():
+                    self._start_new_trace()
+                continue
 
-            enabled_transitions: set[SimPetriNet.SimTransition] = self._handle_enabled_transition()
+            if self._firing_version != SimPetriNet.SimTransition.firing_version:
+                self._specialize()
 
-            if not enabled_transitions:
+            # Fire silent transitions in the compiled loop up to the next transition that needs to be handled here
+            t: int = _run_until_visible(
+                self._marking, arrays.t_in_ptr, arrays.t_in_place, arrays.t_in_w,
+                arrays.t_out_ptr, arrays.t_out_place, arrays.t_out_w, arrays.p_cons_ptr, arrays.p_cons_trans,
+                self._t_stop, self._final_marking_array, self._has_fm, self.fm_leq_accepted,
+                self._enabled, self._enabled_pos, self._n_enabled, self._rng_state
+            )
+
+            if t == DEADLOCK:
+                # Ends the trace on the next iteration
+                continue
+
+            if t == STOP:
                 self._start_new_trace()
                 continue
 
+            # Fire transition, silent ones are handed back for their resources or callback only
+            if self._fire(t) and arrays.t_is_visible[t]:
+                self._record_visible(t)
+                return t
+
+    def _next_visible_python(self) -> int:
+        """Simulate up to the next visible transition with the Python semantics, fire it and return its id"""
+        while True:
+            enabled: List[int] = self._python_enabled()
+            # The trace ends once it is long enough or no transition is enabled anymore
+            if self.visible_transitions_count >= self.max_trace_length or not enabled:
+                # Handle invalid trace, otherwise start new trace
+                if not self._handle_invalid_trace():
+                    self._start_new_trace()
+                continue
+
             # Select and fire transition
-            current_transition: Optional[SimPetriNet.SimTransition] = self._fire_transition(enabled_transitions)
-            event_yield = self._execute_transition(current_transition)
+            t: Optional[int] = self._fire_transition(enabled, self._final_marking_reached())
+            if t is None:
+                self._start_new_trace()
+                continue
+
+            if self._fire(t) and self._arrays.t_is_visible[t]:
+                self._record_visible(t)
+                return t
+
+    def next_batch(self, n: int) -> List[Event]:
+        """Generate the next n events, only the timestamps are formatted once the whole batch is simulated"""
+        events: List[Event] = []
+        timestamps_ns: np.ndarray = np.empty(n, dtype=np.int64)
+        for i in range(n):
+            # The event is created when its transition fired, callbacks may change the attributes afterwards
+            t: int = self._next_visible_transition()
+            events.append(self._create_event(t, None, self.current_case_id))
+            timestamps_ns[i] = self._current_ns
+
+        timestamp_key: str = self.timestamp_key
+        for event, timestamp in zip(events, self._format_timestamps(timestamps_ns)):
+            event[timestamp_key] = timestamp
+        return events
 
-            if event_yield:
-                return event_yield
+    def __next__(self) -> Event:
+        """Generate next event in the Petri net simulation"""
+        t: int = self._next_visible_transition()
+        return self._create_event(t, self._format_timestamp(self._current_ns), self.current_case_id)
 
     def __iter__(self) -> Iterator[Event]:
         """Return self as an iterator"""
@@ -198,6 +425,8 @@ class NetSimulator:
         print(f"Starting simulation with max_traces={max_traces}")
         event_log: list[Event] = []
 
+        # Threads instead of processes: the nets hold callbacks that cannot be pickled, and the compiled token game
+        # releases the GIL so the processes still run in parallel
         with ThreadPoolExecutor() as executor:
             futures = [executor.submit(self._simulate_process, net, im, fm, max_traces) for net, im, fm in
                        self.processes]
@@ -214,10 +443,8 @@ class NetSimulator:
         print(f"Simulating process {net.name} with max_traces={max_traces}")
         generator: PetriNetEventGenerator = PetriNetEventGenerator(net, im, fm)
         process_event_log = []
-        for event in generator:
-            process_event_log.append(event)
-            if len(process_event_log) >= max_traces:
-                break
+        while len(process_event_log) < max_traces:
+            process_event_log.extend(generator.next_batch(min(1024, max_traces - len(process_event_log))))
         print(f"Process {net.name} simulation generated {len(process_event_log)} events")
         return process_event_log
 
@@ -261,49 +488,58 @@ class AgentBasedNetSimulator:
         """
         print(f"Starting agent-based simulation with max_traces={max_traces}")
 
-        start_time = datetime.datetime.now()
-        end_time = start_time + max_time
+        deadline_ns: int = time.monotonic_ns() + int(max_time.total_seconds() * 1e9)
 
         # Initialize agents' event generators
-        for agent in self.agents.values():
+        agents: List[ProcessAgent] = list(self.agents.values())
+        for agent in agents:
             agent.initialize_generator()
+            agent.done = len(agent.event_log) >= max_traces
+        n_done: int = sum(agent.done for agent in agents)
+
+        # Stack the state of all agents, one row per agent, so that their next transitions are selected at once
+        n_places: int = max((len(agent.generator._marking) for agent in agents), default=0)
+        n_transitions: int = max((len(agent.generator._transitions) for agent in agents), default=0)
+        markings: np.ndarray = np.zeros((len(agents), n_places), dtype=np.int32)
+        final_markings: np.ndarray = np.zeros((len(agents), n_places), dtype=np.int32)
+        enabled: np.ndarray = np.zeros((len(agents), n_transitions), dtype=np.int32)
+        n_enabled: np.ndarray = np.zeros(len(agents), dtype=np.int32)
+        rng_states: np.ndarray = np.zeros(len(agents), dtype=np.uint64)
+        for a, agent in enumerate(agents):
+            agent.generator._share_state(markings[a], final_markings[a], enabled[a],
+                                         n_enabled[a:a + 1], rng_states[a:a + 1])
+        has_final_marking: np.ndarray = np.array([agent.generator._has_fm for agent in agents], dtype=np.bool_)
+        fm_leq_accepted: np.ndarray = np.array([agent.generator.fm_leq_accepted for agent in agents], dtype=np.bool_)
+        selected: np.ndarray = np.empty(len(agents), dtype=np.int32)
+
+        i: int = 0
+        while n_done < len(agents):
+            # Reading the clock is comparatively expensive, only check the deadline every 64 iterations
+            if (i & 63) == 0 and time.monotonic_ns() >= deadline_ns:
+                break
+            i += 1
+
+            # Select the next transition of all agents in parallel, a selection only depends on the agent's own
+            # marking; firing stays sequential since the agents compete for the shared resources
+            _select_transitions(markings, final_markings, has_final_marking, fm_leq_accepted,
+                                enabled, n_enabled, rng_states, selected)
 
-        while datetime.datetime.now() < end_time:
             # Let each agent attempt to execute its next action
-            for agent in self.agents.values():
-                if len(agent.event_log) >= max_traces:
+            for agent, t in zip(agents, selected.tolist()):
+                if agent.done:
                     continue
 
                 # Try to execute next transition
-                event = agent.execute_next_transition(self.shared_resources)
+                event = agent.execute_transition(t, self.shared_resources)
                 if event:
                     self.event_log.append(event)
-
-                # Agent interaction/collaboration logic can be added here
-                self._handle_agent_interactions(agent)
-
-            # Check if all agents have completed their traces
-            if all(len(agent.event_log) >= max_traces for agent in self.agents.values()):
-                break
+                    if len(agent.event_log) >= max_traces:
+                        agent.done = True
+                        n_done += 1
 
         print(f"Simulation completed with {len(self.event_log)} total events")
         return self.event_log
 
-    def _handle_agent_interactions(self, current_agent: 'ProcessAgent'):
-        """Handle interactions between agents"""
-        # Example: Agents can communicate about resource availability
-        for other_agent in self.agents.values():
-            if other_agent != current_agent:
-                self._coordinate_resources(current_agent, other_agent)
-
-    def _coordinate_resources(self, agent1: 'ProcessAgent', agent2: 'ProcessAgent'):
-        """Coordinate resource usage between agents"""
-        # Example: Simple resource coordination
-        for resource in self.shared_resources.values():
-            if not resource.is_available():
-                # Agents could negotiate or adjust their strategies here
-                pass
-
 
 class ProcessAgent:
     """
@@ -318,6 +554,8 @@ class ProcessAgent:
         self.final_marking = final_marking
         self.event_log: List[Event] = []
         self.generator: Optional[PetriNetEventGenerator] = None
+        # Set by the simulator once the agent generated enough events
+        self.done: bool = False
 
     def initialize_generator(self):
         """Initialize the event generator for this agent"""
@@ -337,23 +575,34 @@ class ProcessAgent:
         try:
             # Get next possible transition
             enabled = self.generator._handle_enabled_transition()
-            if not enabled:
+            if len(enabled) == 0:
                 return None
 
             # Check resource availability before executing
-            selected_transition = self.generator._fire_transition(enabled)
-            if selected_transition and self._can_acquire_resources(selected_transition, available_resources):
-                event = self.generator._execute_transition(selected_transition)
-                if event:
-                    event['agent_id'] = self.agent_id
-                    self.event_log.append(event)
-                return event
+            selected_transition = self.generator._fire_transition(enabled, self.generator._final_marking_reached())
+            if selected_transition is not None:
+                return self.execute_transition(selected_transition, available_resources)
 
         except StopIteration:
             return None
 
         return None
 
+    def execute_transition(self, t: int, available_resources: Dict[str, BaseResource]) -> Optional[Event]:
+        """
+        Execute a transition selected for this agent if possible, considering resource availability
+
+        Negative ids (no transition enabled or stopping in the final marking) do nothing.
+        """
+        if t < 0 or not self._can_acquire_resources(self.generator._transitions[t], available_resources):
+            return None
+
+        event = self.generator._execute_transition(t)
+        if event:
+            event['agent_id'] = self.agent_id
+            self.event_log.append(event)
+        return event
+
     def _can_acquire_resources(self, transition: SimPetriNet.SimTransition,
                                available_resources: Dict[str, BaseResource]) -> bool:
         """Check if all required resources are available"""
@@ -383,11 +632,6 @@ if __name__ == "__main__":
     # pm4py.view_petri_net(net, initial_marking=im, final_marking=fm)
     generator: PetriNetEventGenerator = PetriNetEventGenerator(net, im, fm)
 
-    event_log: list[Event] = []
-
-    for i, event in enumerate(generator):
-        event_log.append(event)
-        if len(event_log) >= 100:
-            break
+    event_log: list[Event] = generator.next_batch(100)
 
     print(tabulate(event_log, headers='keys', tablefmt='pretty'))
@@ -1,15 +1,17 @@
 import datetime
-from datetime import timedelta
+import sys
+from functools import lru_cache
 
-import pm4py
-import simpy
-from typing import Dict, Set, Optional, List
-from pm4py import Marking
-from pm4py.objects.petri_net.utils import petri_utils
+from typing import Dict
+from pm4py.objects.petri_net.semantics import ClassicSemantics
 
 from src.generation.basic_playout import apply_playout, Parameters
-from src.generation.constants import SimPetriNet, add_sim_arc_from_to
-from src.generation.examples import create_online_order_net
+
+
+@lru_cache(maxsize=1)
+def _default_timestamp() -> datetime.datetime:
+    """Return the initial timestamp, taken once on first use and shared by all simulations"""
+    return datetime.datetime.now()
 
 
 def build_parameters() -> Dict[Parameters, any]:
@@ -26,20 +28,26 @@ def build_parameters() -> Dict[Parameters, any]:
     return {
         Parameters.NO_TRACES: 1,
         # Parameters.MAX_TRACE_LENGTH: 10,
-        Parameters.INITIAL_TIMESTAMP: datetime.datetime.now(),
+        Parameters.INITIAL_TIMESTAMP: _default_timestamp(),
         Parameters.INITIAL_CASE_ID: 0,
-        Parameters.PETRI_SEMANTICS: pm4py.objects.petri_net.semantics.ClassicSemantics(),
+        Parameters.PETRI_SEMANTICS: ClassicSemantics(),
         Parameters.ADD_ONLY_IF_FM_IS_REACHED: True,
         Parameters.FM_LEQ_ACCEPTED: False
     }
 
 
 def simulate_order_process():
+    # Only needed to run the example, not to build its parameters
+    from src.generation.examples import create_online_order_net
+
     net, im, fm = create_online_order_net()
-    ev = apply_playout(net, im, fm, build_parameters())
-    dataframe = pm4py.convert_to_dataframe(ev)
+    # The dataframe is built directly from the played out transitions, without an intermediate event log
+    parameters = build_parameters()
+    parameters[Parameters.RETURN_DATAFRAME] = True
+    dataframe = apply_playout(net, im, fm, parameters)
     # pm4py.view_petri_net(net, initial_marking=im, final_marking=fm)
-    print(dataframe.to_string())
+    # Stream the rows instead of building the whole table as one string
+    dataframe.to_csv(sys.stdout, sep='\t', index=False)
 
 
 if __name__ == "__main__":
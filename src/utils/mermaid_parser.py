@@ -1,10 +1,52 @@
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 import re
 
 from pm4py import BPMN
-from mermaid.graph import Graph
+
+try:
+    import re2 as _re_token
+except ImportError:
+    _re_token = re
+
+# Patterns used on every conversion, compiled once
+_RE_STRIP = re.compile(r'flowchart\s+[A-Z]{2}|%%{.*?}%%', re.DOTALL)
+_RE_SUBGRAPH = re.compile(r'subgraph\s+(\w+)\s*\[(.*?)\]')
+_RE_NODE = re.compile(r'(\w+)\[(.*?)\]')
+# Source, separator and target of a flow, the target ends at a condition label or at the next separator
+_RE_FLOW = re.compile(r'(\w+)\s*(-->|(?!.*-->)-\.->)\s*(\w+)\s*(?:\|.*|\2.*)?')
+# One stripped, non-empty line per match, tagged as subgraph start, subgraph end, flow or node. Each group ends
+# at the last non-space character, so that re does not retry the line end after every character. The scan
+# uses RE2 if it is installed, which guarantees linear time on any generated diagram
+_RE_TOKEN = _re_token.compile(
+    r'(?m)^[^\S\n]*(?:(?P<sg>subgraph(?:.*\S)?)|(?P<end>end)|(?P<flow>.*?-\.?->(?:.*\S)?)|(?P<node>[^%\s](?:.*\S)?))[^\S\n]*$'
+)
+
+# Node types by the tag returned from _classify_node
+_NODE_TYPES: Tuple[type, ...] = (BPMN.StartEvent, BPMN.EndEvent, BPMN.ExclusiveGateway, BPMN.Gateway, BPMN.Task)
+# Tags of the lowercase name prefixes, none of them is a prefix of another one
+_PREFIX_KINDS: Dict[str, int] = {'start': 0, 'begin': 0, 'end': 1, 'check': 3, 'verify': 3, 'validate': 3}
+_PREFIX_LENGTHS: Tuple[int, ...] = tuple(sorted({len(prefix) for prefix in _PREFIX_KINDS}))
+
+
+@lru_cache(maxsize=4096)
+def _classify_node(node_name: str) -> int:
+    """Return the index in _NODE_TYPES of the node type matching the name"""
+    name: str = node_name.lower()
+    kind: int = 4
+    for length in _PREFIX_LENGTHS:
+        kind = _PREFIX_KINDS.get(name[:length], 4)
+        if kind != 4:
+            break
+    # A question is an exclusive gateway, unless the name already starts an event
+    if kind > 1 and '?' in node_name:
+        return 2
+    return kind
+
 
 class MermaidToBPMNConverter:
+    __slots__ = ('bpmn', 'node_map')
+
     def __init__(self):
         self.bpmn = BPMN()
         self.node_map: Dict[str, BPMN.BPMNNode] = {}
@@ -13,119 +55,99 @@ class MermaidToBPMNConverter:
         """
         Parse Mermaid BPMN content and convert it to PM4PY BPMN object
         """
-        # Reset state for new conversion
-        self.bpmn = BPMN()
+        # Reset state for new conversion, reusing the BPMN object if it is still empty
+        if self.bpmn.get_nodes() or self.bpmn.get_flows():
+            self.bpmn = BPMN()
         self.node_map = {}
 
-        # Clean and prepare the mermaid content
-        lines = self._clean_mermaid_content(mermaid_content)
-
-        # Process each line
+        # The tokens are cached per content, the BPMN objects are built fresh from them on every call
         current_subprocess = None
+        add_flow = self._add_flow
+        add_node = self._add_node
 
-        for line in lines:
-            if line.strip().startswith('subgraph'):
+        for token in _tokenize(mermaid_content):
+            kind = token[0]
+            if kind == 'node':
+                # Handle nodes
+                add_node(token[1], token[2], token[3], current_subprocess)
+            elif kind == 'flow':
+                # Handle flows
+                add_flow(token[1], token[2], token[3], current_subprocess)
+            elif kind == 'sg':
                 # Handle subprocess/pool
-                subprocess_name = self._extract_subprocess_name(line)
-                current_subprocess = self._create_subprocess(subprocess_name)
-            elif line.strip() == 'end':
+                current_subprocess = self._create_subprocess(token[1])
+            else:
                 current_subprocess = None
-            elif '-->' in line or '-.->' in line:
-                # Handle flows
-                self._process_flow(line, current_subprocess)
-            elif line.strip() and not line.strip().startswith('%'):
-                # Handle nodes
-                self._process_node(line, current_subprocess)
 
         return self.bpmn
 
-    def _clean_mermaid_content(self, content: str) -> List[str]:
-        """Clean and prepare mermaid content for parsing"""
-        # Remove flowchart TB or other directives
-        content = re.sub(r'flowchart\s+[A-Z]{2}', '', content)
-        # Remove initialization configs
-        content = re.sub(r'%%{.*?}%%', '', content, flags=re.DOTALL)
-        # Split into lines and remove empty ones
-        return [line.strip() for line in content.split('\n') if line.strip()]
-
-    def _extract_subprocess_name(self, line: str) -> str:
-        """Extract subprocess name from subgraph declaration"""
-        match = re.search(r'subgraph\s+(\w+)\s*\[(.*?)\]', line)
-        if match:
-            return match.group(2)
-        return "Default Pool"
-
     def _create_subprocess(self, name: str) -> BPMN.SubProcess:
         """Create a new subprocess/pool"""
         subprocess = BPMN.SubProcess(name=name)
         self.bpmn.add_node(subprocess)
         return subprocess
 
-    def _process_node(self, line: str, subprocess: Optional[BPMN.SubProcess]) -> None:
-        """Process a node declaration line"""
-        # Extract node information
-        match = re.search(r'(\w+)\[(.*?)\]', line)
-        if not match:
-            return
-
-        node_id, node_name = match.groups()
-
-        # Determine node type and create appropriate BPMN node
-        node = self._create_node(node_id, node_name)
-
-        if node:
-            if subprocess:
-                node.set_process(subprocess)
-            self.bpmn.add_node(node)
-            self.node_map[node_id] = node
+    def _add_node(self, node_id: str, node_name: str, kind: int, subprocess: Optional[BPMN.SubProcess]) -> None:
+        """Add a declared node of the given kind"""
+        node = _NODE_TYPES[kind](id=node_id, name=node_name)
+        if subprocess:
+            node.set_process(subprocess)
+        self.bpmn.add_node(node)
+        self.node_map[node_id] = node
 
     def _create_node(self, node_id: str, node_name: str) -> Optional[BPMN.BPMNNode]:
         """Create appropriate BPMN node based on context and naming"""
-        if node_name.lower().startswith(('start', 'begin')):
-            return BPMN.StartEvent(id=node_id, name=node_name)
-        elif node_name.lower().startswith('end'):
-            return BPMN.EndEvent(id=node_id, name=node_name)
-        elif '?' in node_name:
-            return BPMN.ExclusiveGateway(id=node_id, name=node_name)
-        elif node_name.lower().startswith(('check', 'verify', 'validate')):
-            return BPMN.Gateway(id=node_id, name=node_name)
-        else:
-            return BPMN.Task(id=node_id, name=node_name)
-
-    def _process_flow(self, line: str, subprocess: Optional[BPMN.SubProcess]) -> None:
-        """Process a flow declaration line"""
-        # Handle both normal and dotted flows
-        if '-->' in line:
-            source, target = self._extract_flow_nodes(line, '-->')
-            flow_type = BPMN.SequenceFlow
-        elif '-.->' in line:
-            source, target = self._extract_flow_nodes(line, '-.->')
-            flow_type = BPMN.MessageFlow
-        else:
-            return
+        return _NODE_TYPES[_classify_node(node_name)](id=node_id, name=node_name)
 
-        if source in self.node_map and target in self.node_map:
+    def _add_flow(self, source: str, separator: str, target: str, subprocess: Optional[BPMN.SubProcess]) -> None:
+        """Add a flow between two declared nodes, flows from or to undeclared nodes are ignored"""
+        flow_type = BPMN.SequenceFlow if separator == '-->' else BPMN.MessageFlow
+
+        source_node = self.node_map.get(source)
+        target_node = self.node_map.get(target)
+        if source_node is not None and target_node is not None:
             flow = flow_type(
-                source=self.node_map[source],
-                target=self.node_map[target]
+                source=source_node,
+                target=target_node
             )
             if subprocess:
                 flow.set_process(subprocess)
             self.bpmn.add_flow(flow)
 
-    def _extract_flow_nodes(self, line: str, separator: str) -> Tuple[str, str]:
-        """Extract source and target nodes from a flow declaration"""
-        parts = line.split(separator)
-        source = parts[0].strip()
-        target = parts[1].strip()
-
-        # Handle condition labels if present
-        if '|' in target:
-            target = target.split('|')[0].strip()
-
-        return source, target
-
     def save_to_file(self, filename: str) -> None:
         """Save the BPMN object to a file (implementation depends on PM4PY's capabilities)"""
         # This would need to be implemented based on PM4PY's export capabilities
-        pass
\ No newline at end of file
+        pass
+
+
+@lru_cache(maxsize=64)
+def _tokenize(mermaid_content: str) -> Tuple[Tuple, ...]:
+    """
+    Tokenize the Mermaid content into immutable tuples, ('sg', name), ('end',), ('node', id, name, kind)
+    or ('flow', source, separator, target), in the order of their lines
+    """
+    # Remove flowchart TB or other directives and initialization configs in a single pass
+    content = _RE_STRIP.sub('', mermaid_content)
+
+    tokens: List[Tuple] = []
+    for match in _RE_TOKEN.finditer(content):
+        kind = match.lastgroup
+        line = match[kind]
+        if kind == 'node':
+            # Extract node information
+            node_match = _RE_NODE.search(line)
+            if node_match:
+                node_id, node_name = node_match.groups()
+                tokens.append(('node', node_id, node_name, _classify_node(node_name)))
+        elif kind == 'flow':
+            # Handle both normal and dotted flows, a dotted flow only if the line has no normal one
+            flow_match = _RE_FLOW.fullmatch(line)
+            if flow_match:
+                tokens.append(('flow',) + flow_match.groups())
+        elif kind == 'sg':
+            # Extract subprocess name from subgraph declaration
+            subgraph_match = _RE_SUBGRAPH.search(line)
+            tokens.append(('sg', subgraph_match.group(2) if subgraph_match else "Default Pool"))
+        else:
+            tokens.append(('end',))
+    return tuple(tokens)
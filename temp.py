@@ -1,3 +1,7 @@
+import hashlib
+import os
+import shutil
+
 import pandas as pd
 import pm4py
 from mermaid.__main__ import Mermaid
@@ -9,10 +13,70 @@ from src.utils.mermaid_parser import MermaidToBPMNConverter
 from mermaid import *
 
 SEPSIS_FEATHER_FILE_PATH: str = "/Users/christianimenkamp/Documents/Data-Repository/Community/sepsis/Sepsis Cases - Event Log.feather"
+SEPSIS_PARQUET_FILE_PATH: str = os.path.splitext(SEPSIS_FEATHER_FILE_PATH)[0] + ".parquet"
+# Columns needed for the process discovery
+EVENT_LOG_COLUMNS: list[str] = ["case:concept:name", "concept:name", "time:timestamp"]
+# Renderings of Mermaid diagrams by content hash (git-ignored)
+MERMAID_CACHE_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "mermaid")
+
+
+def prefetch_file(path: str) -> None:
+    """
+    Ask the kernel to read the whole file into the page cache ahead of the memory-mapped read, where supported.
+    Only worth it for files that are read in full, a column pruned read would pull in the skipped columns as well
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def convert_event_log_to_parquet(feather_path: str, parquet_path: str) -> None:
+    """Convert a feather event log once to parquet, dictionary encoding the repeating case and activity names"""
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    # All columns are converted, so the whole file is read
+    prefetch_file(feather_path)
+    table = feather.read_table(feather_path, memory_map=True)
+    pq.write_table(table, parquet_path, compression="zstd", row_group_size=128_000,
+                   use_dictionary=["case:concept:name", "concept:name"])
+
+
+def read_event_log(path: str) -> pd.DataFrame:
+    """Read the needed columns of a parquet or feather event log memory-mapped and convert them to pandas"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        # pre_buffer already coalesces the reads of the selected column chunks
+        table = pq.read_table(path, columns=EVENT_LOG_COLUMNS, memory_map=True, use_threads=True, pre_buffer=True)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=EVENT_LOG_COLUMNS, memory_map=True, use_threads=True)
+    # Decode the columns in parallel and release the Arrow buffers column by column while converting
+    return table.to_pandas(use_threads=True, self_destruct=True)
+
+
+def render_png(mermaid_content: str, output_path: str) -> None:
+    """Render the Mermaid content to a PNG, reusing an earlier rendering of the same content"""
+    digest: str = hashlib.blake2b(mermaid_content.encode(), digest_size=12).hexdigest()
+    root, ext = os.path.splitext(os.path.basename(output_path))
+    cached_path: str = os.path.join(MERMAID_CACHE_DIR, f"{root}-{digest}{ext}")
+    if not os.path.exists(cached_path):
+        os.makedirs(MERMAID_CACHE_DIR, exist_ok=True)
+        # Creating the Mermaid object already requests the rendering from the Mermaid API
+        render = Mermaid(Graph('Sequence-diagram', mermaid_content))
+        render.to_png(cached_path)
+    shutil.copyfile(cached_path, output_path)
+
 
 if __name__ == "__main__":
 
-    # SEPSIS_LOG: pd.DataFrame = pd.read_feather(SEPSIS_FEATHER_FILE_PATH)
+    # if not os.path.exists(SEPSIS_PARQUET_FILE_PATH):
+    #     convert_event_log_to_parquet(SEPSIS_FEATHER_FILE_PATH, SEPSIS_PARQUET_FILE_PATH)
+    # SEPSIS_LOG: pd.DataFrame = read_event_log(SEPSIS_PARQUET_FILE_PATH)
     #
     # net, im, fm = pm4py.discover_petri_net_inductive(SEPSIS_LOG)
     #
@@ -24,9 +88,6 @@ if __name__ == "__main__":
 
     with open("/Users/christianimenkamp/Documents/Git-Repositorys/Interaction_Strength_and_Niche Overlap/resources/mutualistic-bpmn.mermaid", "r") as file:
         mermaid_content = file.read()
-        sequence = Graph('Sequence-diagram', mermaid_content)
-        render = Mermaid(sequence)
-
-        render.to_png("sequence-diagram.png")
+        render_png(mermaid_content, "sequence-diagram.png")
 
 